@@ -25,3 +25,6 @@ class EolInstructorConfig(AppConfig):
                     PluginSettings.RELATIVE_PATH: "settings.common"}},
         },
     }
+
+    def ready(self):
+        from . import signals  # pylint: disable=unused-import
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+    Benchmarks of the reports on synthetic courses, run in the LMS test
+    environment (make benchmark):
+
+        DJANGO_SETTINGS_MODULE=lms.envs.test pytest -s eol_instructor/benchmarks.py
+
+    For each size tier a course with sections, subsections, units and
+    problems is created with the modulestore factories, plus learners with
+    enrollments, subsection grades, course grades and completions. Each
+    function is measured with cold (empty cache) and warm caches: wall time,
+    peak python memory and SQL queries.
+    The report is written as json to EOL_INSTRUCTOR_BENCHMARK_OUTPUT
+    (benchmark.json) and compared with EOL_INSTRUCTOR_BENCHMARK_BASELINE,
+    the report of a previous release, if given.
+    EOL_INSTRUCTOR_BENCHMARK_TIERS selects the tiers (small,medium).
+"""
+
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from completion.models import BlockCompletion
+from common.djangoapps.student.models import CourseEnrollment, UserProfile
+from common.djangoapps.student.tests.factories import UserFactory
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from lms.djangoapps.grades.models import PersistentCourseGrade, PersistentSubsectionGrade, VisibleBlocks
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from xmodule.modulestore import ModuleStoreEnum
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+from . import utils, views
+
+TIERS = {
+    'small': {'sections': 2, 'subsections': 2, 'units': 2, 'problems': 2, 'learners': 50},
+    'medium': {'sections': 4, 'subsections': 3, 'units': 3, 'problems': 3, 'learners': 500},
+    'large': {'sections': 8, 'subsections': 4, 'units': 3, 'problems': 4, 'learners': 5000},
+}
+SEED = 101
+ATTEMPTED_RATE = 0.8
+COMPLETED_RATE = 0.6
+PASSED_RATE = 0.5
+
+# Called with the course key and a staff user, previous releases read the
+# grades of the course structure as that user
+FUNCTIONS = [
+    ('get_all_persistant_grades', lambda course_key, user: utils.get_all_persistant_grades(user, course_key)),
+    ('get_course_grade_summary', lambda course_key, user: utils.get_course_grade_summary(user, course_key)),
+    ('get_completion_course', lambda course_key, user: utils.get_completion_course(course_key)),
+    ('get_user_data', lambda course_key, user: views.get_user_data(course_key)),
+]
+
+
+def measure(function, *args):
+    """
+        Return the wall time (seconds), peak python memory (bytes) and SQL
+        queries of a call
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        function(*args)
+    wall_time = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'wall_time': wall_time, 'peak_memory': peak_memory, 'queries': len(queries)}
+
+
+def compare(report, baseline):
+    """
+        Return the lines comparing each measure with the baseline report
+    """
+    lines = []
+    for tier, tier_report in report['tiers'].items():
+        baseline_tier = baseline.get('tiers', {}).get(tier)
+        if baseline_tier is None or baseline_tier['params'] != tier_report['params']:
+            continue
+        for name, runs in tier_report['results'].items():
+            for run, result in runs.items():
+                base = baseline_tier['results'].get(name, {}).get(run)
+                if base is None:
+                    continue
+                lines.append("{} {} {}: time x{:.2f}, memory x{:.2f}, queries {} -> {}".format(
+                    tier, name, run,
+                    result['wall_time'] / base['wall_time'] if base['wall_time'] > 0 else 0,
+                    result['peak_memory'] / base['peak_memory'] if base['peak_memory'] > 0 else 0,
+                    base['queries'],
+                    result['queries']))
+    return lines
+
+
+class EolInstructorBenchmark(ModuleStoreTestCase):
+
+    def create_course(self, params):
+        """
+            Create the synthetic course, return it and the usage keys of
+            its graded subsections and problems
+        """
+        course = CourseFactory.create(default_store=ModuleStoreEnum.Type.split)
+        subsections = []
+        problems = []
+        with self.store.bulk_operations(course.id):
+            for section_inx in range(params['sections']):
+                section = ItemFactory.create(parent_location=course.location, category='chapter', display_name='Section {}'.format(section_inx))
+                for subsection_inx in range(params['subsections']):
+                    subsection = ItemFactory.create(
+                        parent_location=section.location,
+                        category='sequential',
+                        display_name='Subsection {}'.format(subsection_inx),
+                        graded=True,
+                        format='Homework')
+                    subsections.append(subsection.location)
+                    for unit_inx in range(params['units']):
+                        unit = ItemFactory.create(parent_location=subsection.location, category='vertical', display_name='Unit {}'.format(unit_inx))
+                        for problem_inx in range(params['problems']):
+                            problem = ItemFactory.create(parent_location=unit.location, category='problem', display_name='Problem {}'.format(problem_inx))
+                            problems.append(problem.location)
+        CourseOverview.get_from_id(course.id)
+        return course, subsections, problems
+
+    def create_learners(self, course, subsections, problems, params, rnd):
+        """
+            Create the enrolled learners with their grades and completions
+        """
+        prefix = 'bench{}'.format(course.id.run)
+        User.objects.bulk_create([
+            User(username='{}_{}'.format(prefix, inx), email='{}_{}@eol.cl'.format(prefix, inx))
+            for inx in range(params['learners'])])
+        users = list(User.objects.filter(username__startswith=prefix + '_'))
+        UserProfile.objects.bulk_create([UserProfile(user=user, name=user.username) for user in users])
+        CourseEnrollment.objects.bulk_create([
+            CourseEnrollment(user=user, course_id=course.id, is_active=True, mode='audit') for user in users])
+        visible_blocks = VisibleBlocks.objects.create(blocks_json='{"blocks": []}', hashed='bench-{}'.format(course.id), course_id=course.id)
+        possible = params['units'] * params['problems']
+        grades = []
+        course_grades = []
+        completions = []
+        for user in users:
+            for usage_key in subsections:
+                attempted = rnd.random() < ATTEMPTED_RATE
+                earned = rnd.randint(0, possible) if attempted else 0
+                grades.append(PersistentSubsectionGrade(
+                    user_id=user.id,
+                    course_id=course.id,
+                    usage_key=usage_key,
+                    course_version='',
+                    earned_all=earned,
+                    possible_all=possible,
+                    earned_graded=earned,
+                    possible_graded=possible,
+                    first_attempted=now() if attempted else None,
+                    visible_blocks=visible_blocks))
+            passed = rnd.random() < PASSED_RATE
+            course_grades.append(PersistentCourseGrade(
+                user_id=user.id,
+                course_id=course.id,
+                course_version='',
+                grading_policy_hash='',
+                percent_grade=0.8 if passed else 0.2,
+                letter_grade='Pass' if passed else '',
+                passed_timestamp=now() if passed else None))
+            for block_key in problems:
+                if rnd.random() < COMPLETED_RATE:
+                    completions.append(BlockCompletion(
+                        user=user,
+                        context_key=course.id,
+                        block_key=block_key,
+                        block_type=block_key.block_type,
+                        completion=1.0))
+        PersistentSubsectionGrade.objects.bulk_create(grades, batch_size=5000)
+        PersistentCourseGrade.objects.bulk_create(course_grades, batch_size=5000)
+        BlockCompletion.objects.bulk_create(completions, batch_size=5000)
+
+    def test_benchmark(self):
+        tiers = os.environ.get('EOL_INSTRUCTOR_BENCHMARK_TIERS', 'small,medium').split(',')
+        report = {'created': datetime.now().isoformat(), 'tiers': {}}
+        rnd = random.Random(SEED)
+        staff = UserFactory(is_staff=True)
+        for tier in tiers:
+            params = TIERS[tier]
+            course, subsections, problems = self.create_course(params)
+            self.create_learners(course, subsections, problems, params, rnd)
+            results = {}
+            for name, function in FUNCTIONS:
+                cache.clear()
+                results[name] = {'cold': measure(function, course.id, staff)}
+                results[name]['warm'] = measure(function, course.id, staff)
+            report['tiers'][tier] = {'params': params, 'results': results}
+            for name, runs in results.items():
+                for run, result in runs.items():
+                    print("{} {} {}: {:.3f}s, {:.1f}MB, {} queries".format(
+                        tier, name, run, result['wall_time'], result['peak_memory'] / 2 ** 20, result['queries']))
+        with open(os.environ.get('EOL_INSTRUCTOR_BENCHMARK_OUTPUT', 'benchmark.json'), 'w') as output:
+            json.dump(report, output, indent=2)
+        baseline = os.environ.get('EOL_INSTRUCTOR_BENCHMARK_BASELINE')
+        if baseline:
+            with open(baseline) as baseline_file:
+                for line in compare(report, json.load(baseline_file)):
+                    print(line)
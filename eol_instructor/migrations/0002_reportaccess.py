@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from django.db import migrations, models
+import opaque_keys.edx.django.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eol_instructor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('course_id', opaque_keys.edx.django.models.CourseKeyField(max_length=255)),
+                ('report', models.CharField(max_length=32)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('last_access', models.DateTimeField()),
+                ('duration', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('course_id', 'report')},
+            },
+        ),
+    ]
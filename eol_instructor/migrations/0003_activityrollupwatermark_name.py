@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eol_instructor', '0002_reportaccess'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activityrollupwatermark',
+            name='name',
+            field=models.CharField(max_length=320, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eol_instructor', '0003_activityrollupwatermark_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportaccess',
+            name='hits',
+            field=models.FloatField(default=0),
+        ),
+    ]
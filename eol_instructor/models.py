@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+from django.contrib.auth.models import User
+from django.db import models
+from opaque_keys.edx.django.models import CourseKeyField
+
+# Block type of the rows that count any activity in the course
+ALL_BLOCK_TYPES = ''
+
+
+class LearnerDailyActivity(models.Model):
+    """
+        Learners that modified a StudentModule of the course in the day,
+        once with ALL_BLOCK_TYPES and once for each block type
+    """
+    course_id = CourseKeyField(max_length=255)
+    date = models.DateField()
+    block_type = models.CharField(max_length=64, blank=True, default=ALL_BLOCK_TYPES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = [['course_id', 'block_type', 'date', 'user']]
+
+
+class CourseDailyActivity(models.Model):
+    """
+        Distinct active learners of the course in the day, by block type
+    """
+    course_id = CourseKeyField(max_length=255)
+    date = models.DateField()
+    block_type = models.CharField(max_length=64, blank=True, default=ALL_BLOCK_TYPES)
+    active_learners = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['course_id', 'block_type', 'date']]
+
+
+class ActivityRollupWatermark(models.Model):
+    """
+        Last StudentModule modified time included in the activity rollup, of
+        all the courses or of the history of one course
+    """
+    name = models.CharField(max_length=320, unique=True)
+    modified = models.DateTimeField()
+
+
+class ReportAccess(models.Model):
+    """
+        Views of a course report, used to pre-warm the most viewed reports.
+        hits are the views decayed to last_access (see record_report_access),
+        duration is the seconds taken by the last pre-warm.
+    """
+    course_id = CourseKeyField(max_length=255)
+    report = models.CharField(max_length=32)
+    hits = models.FloatField(default=0)
+    last_access = models.DateTimeField()
+    duration = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        unique_together = [['course_id', 'report']]
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import struct
+import numpy as np
+from collections import OrderedDict
+
+# Compact binary format of the cached reports:
+#   MAGIC | uint32 length of the json header | json header | arrays
+# The json header has the small fields of the report (column names are
+# stored once) and the name, dtype, shape and offset of each array.
+# Grades are stored as fixed point hundredths of a percent (66.67 -> 6667)
+# and strings (usernames, emails) as a '\x00' separated string table.
+MAGIC = b'EOLR1'
+HEADER_LENGTH = struct.Struct('<I')
+STRING_SEPARATOR = '\x00'
+
+
+class ReportBuilder(object):
+    """
+        Collect the json header and the arrays of a report
+    """
+    def __init__(self, kind, meta):
+        self.header = {'kind': kind, 'meta': meta, 'arrays': {}}
+        self.buffers = []
+        self.offset = 0
+
+    def add_array(self, name, values):
+        values = np.ascontiguousarray(values)
+        buffer = values.tobytes()
+        self.header['arrays'][name] = {
+            'dtype': values.dtype.str,
+            'shape': list(values.shape),
+            'offset': self.offset,
+        }
+        self.buffers.append(buffer)
+        self.offset += len(buffer)
+
+    def add_strings(self, name, values):
+        self.add_array(name, np.frombuffer(STRING_SEPARATOR.join(values).encode('utf-8'), dtype=np.uint8))
+        self.header['arrays'][name]['count'] = len(values)
+
+    def to_bytes(self):
+        header = json.dumps(self.header, separators=(',', ':')).encode('utf-8')
+        return b''.join([MAGIC, HEADER_LENGTH.pack(len(header)), header] + self.buffers)
+
+
+class ReportReader(object):
+    """
+        Read the json header and the arrays of an encoded report
+    """
+    def __init__(self, blob):
+        if not blob.startswith(MAGIC):
+            raise ValueError("Invalid report format")
+        start = len(MAGIC) + HEADER_LENGTH.size
+        header_length = HEADER_LENGTH.unpack_from(blob, len(MAGIC))[0]
+        self.header = json.loads(blob[start:start + header_length].decode('utf-8'))
+        self.blob = memoryview(blob)[start + header_length:]
+
+    @property
+    def kind(self):
+        return self.header['kind']
+
+    @property
+    def meta(self):
+        return self.header['meta']
+
+    def get_array(self, name):
+        info = self.header['arrays'][name]
+        dtype = np.dtype(info['dtype'])
+        count = int(np.prod(info['shape']))
+        return np.frombuffer(self.blob, dtype=dtype, count=count, offset=info['offset']).reshape(info['shape'])
+
+    def get_strings(self, name):
+        if self.header['arrays'][name]['count'] == 0:
+            return []
+        return self.get_array(name).tobytes().decode('utf-8').split(STRING_SEPARATOR)
+
+
+def _fixed_point(values):
+    """
+        Return the percents as the smallest unsigned array of hundredths,
+        NaN values (missing) are stored as the max value of the dtype
+    """
+    hundredths = np.rint(np.asarray(values, dtype=np.float64) * 100)
+    missing = np.isnan(hundredths)
+    dtype = np.dtype('<u2')
+    if not missing.all() and np.nanmax(hundredths) >= np.iinfo(np.uint16).max:
+        dtype = np.dtype('<u4')
+    hundredths[missing] = np.iinfo(dtype).max
+    return hundredths.astype(dtype)
+
+
+def _from_fixed_point(hundredths):
+    """
+        Inverse of _fixed_point, missing values are returned as None
+    """
+    missing = np.iinfo(hundredths.dtype).max
+    return [None if x == missing else x / 100 for x in hundredths.tolist()]
+
+
+def encode_grades_report(data, index=None):
+    """
+        Encode the eol_grades report (details, summary, time...) and its
+        sort index (see utils.get_grades_sort_index)
+    """
+    details = data['details']
+    labels = [x['data'] for x in details['headers'][1:]]
+    summary = OrderedDict()
+    summary_grades = []
+    for block_id, block_summary in data['summary'].items():
+        summary[block_id] = {k: v for k, v in block_summary.items() if k != 'grades'}
+        summary[block_id]['n_grades'] = len(block_summary['grades'])
+        summary_grades.extend(block_summary['grades'])
+    meta = {k: v for k, v in data.items() if k not in ['details', 'summary']}
+    meta['headers'] = details['headers']
+    meta['summary'] = list(summary.items())
+    builder = ReportBuilder('grades', meta)
+    builder.add_strings('usernames', [row['username'] for row in details['data']])
+    # Students without an attempted grade have an integer 0 in the report
+    grades = [[np.nan if type(row[label]) is int else row[label] for label in labels] for row in details['data']]
+    builder.add_array('grades', _fixed_point(np.array(grades, dtype=np.float64).reshape((len(grades), len(labels)))))
+    builder.add_array('summary_grades', _fixed_point(summary_grades))
+    index = index or {}
+    index_dtype = np.dtype('<u2') if len(details['data']) <= np.iinfo(np.uint16).max else np.dtype('<u4')
+    builder.header['index'] = list(index.keys())
+    for inx, (name, order) in enumerate(index.items()):
+        builder.add_array('index-{}'.format(inx), np.asarray(order).astype(index_dtype))
+    return builder.to_bytes()
+
+
+def decode_grades_report(blob):
+    """
+        Decode an encoded eol_grades report to its json serializable form
+    """
+    reader = ReportReader(blob)
+    meta = dict(reader.meta)
+    headers = meta.pop('headers')
+    summary_items = meta.pop('summary')
+    labels = [x['data'] for x in headers[1:]]
+    usernames = reader.get_strings('usernames')
+    grades = reader.get_array('grades')
+    missing = np.iinfo(grades.dtype).max
+    rows = []
+    for username, user_grades in zip(usernames, grades.tolist()):
+        row = {label: 0 if x == missing else x / 100 for label, x in zip(labels, user_grades)}
+        row['username'] = username
+        rows.append(row)
+    summary_grades = _from_fixed_point(reader.get_array('summary_grades'))
+    summary = OrderedDict()
+    start = 0
+    for block_id, block_summary in summary_items:
+        n_grades = block_summary.pop('n_grades')
+        summary[block_id] = {'grades': summary_grades[start:start + n_grades]}
+        summary[block_id].update(block_summary)
+        start += n_grades
+    data = {'details': {'headers': headers, 'data': rows}, 'summary': summary}
+    data.update(meta)
+    return data
+
+
+def decode_grades_columns(blob):
+    """
+        Decode the eol_grades report as columns, without building the
+        learner rows nor the summary grades: usernames, grades (hundredths,
+        'missing' when not attempted), headers, the summary without its
+        grades and the rest of the report fields
+    """
+    reader = ReportReader(blob)
+    data = dict(reader.meta)
+    data['summary'] = OrderedDict(
+        (block_id, {k: v for k, v in block_summary.items() if k != 'n_grades'})
+        for block_id, block_summary in data['summary'])
+    data['usernames'] = reader.get_strings('usernames')
+    data['grades'] = reader.get_array('grades')
+    data['missing'] = int(np.iinfo(data['grades'].dtype).max)
+    return data
+
+
+def decode_grades_index(blob):
+    """
+        Return the sort index stored with the eol_grades report
+    """
+    reader = ReportReader(blob)
+    return {name: reader.get_array('index-{}'.format(inx)) for inx, name in enumerate(reader.header.get('index', []))}
+
+
+def encode_completion_report(data):
+    """
+        Encode the eol_completion report (data, completion, time...),
+        rows are [email, username, rut, percents..., 'Si'/'No']
+    """
+    rows = data['data']
+    meta = {k: v for k, v in data.items() if k != 'data'}
+    # Courses without students have a [[True]] placeholder
+    meta['empty'] = rows == [[True]]
+    if meta['empty']:
+        rows = []
+    builder = ReportBuilder('completion', meta)
+    builder.add_strings('emails', [row[0] for row in rows])
+    builder.add_strings('usernames', [row[1] for row in rows])
+    builder.add_strings('ruts', [row[2] for row in rows])
+    n_percents = len(rows[0]) - 4 if len(rows) > 0 else 0
+    builder.add_array('percents', _fixed_point(np.array([row[3:-1] for row in rows], dtype=np.float64).reshape((len(rows), n_percents))))
+    builder.add_array('certificates', np.array([row[-1] == 'Si' for row in rows], dtype=np.uint8))
+    return builder.to_bytes()
+
+
+def decode_completion_report(blob):
+    """
+        Decode an encoded eol_completion report to its json serializable form
+    """
+    reader = ReportReader(blob)
+    data = dict(reader.meta)
+    empty = data.pop('empty')
+    rows = []
+    percents = reader.get_array('percents').tolist()
+    certificates = reader.get_array('certificates').tolist()
+    for email, username, rut, user_percents, certificate in zip(
+            reader.get_strings('emails'),
+            reader.get_strings('usernames'),
+            reader.get_strings('ruts'),
+            percents,
+            certificates):
+        rows.append([email, username, rut] + [x / 100 for x in user_percents] + ['Si' if certificate else 'No'])
+    data['data'] = [[True]] if empty else rows
+    return data
+
+
+def decode_report(blob):
+    """
+        Decode an encoded report of any kind
+    """
+    kind = ReportReader(blob).kind
+    if kind == 'grades':
+        return decode_grades_report(blob)
+    return decode_completion_report(blob)
+
+
+def get_report_rows(data):
+    """
+        Return the (username, row) of each learner of a decoded report
+    """
+    if 'details' in data:
+        return [(row['username'], row) for row in data['details']['data']]
+    if data['data'] == [[True]]:
+        return []
+    return [(row[1], row) for row in data['data']]
+
+
+def get_row_hashes(data):
+    """
+        Return the username -> 64 bits content hash of each learner row
+        of a decoded report
+    """
+    return OrderedDict(
+        (username, int.from_bytes(hashlib.blake2b(json.dumps(row, sort_keys=True).encode('utf-8'), digest_size=8).digest(), 'little'))
+        for username, row in get_report_rows(data))
+
+
+def encode_row_hashes(row_hashes):
+    builder = ReportBuilder('rows', {})
+    builder.add_strings('usernames', list(row_hashes.keys()))
+    builder.add_array('hashes', np.array(list(row_hashes.values()), dtype='<u8'))
+    return builder.to_bytes()
+
+
+def decode_row_hashes(blob):
+    reader = ReportReader(blob)
+    return OrderedDict(zip(reader.get_strings('usernames'), reader.get_array('hashes').tolist()))
+
+
+def get_report_delta(data, row_hashes, since_row_hashes):
+    """
+        Return the rows of the decoded report (with its row_hashes) added
+        or changed since the version with since_row_hashes, and the
+        usernames of the removed rows
+    """
+    delta = {'added': [], 'changed': [], 'removed': [x for x in since_row_hashes if x not in row_hashes]}
+    for username, row in get_report_rows(data):
+        if username not in since_row_hashes:
+            delta['added'].append(row)
+        elif since_row_hashes[username] != row_hashes[username]:
+            delta['changed'].append(row)
+    return delta
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+import zlib
+from django.core.cache import cache
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# Memcached rejects items bigger than 1 MB (by default)
+CHUNK_SIZE = 900 * 1024
+# Chunks outlive their manifest, so a reader that got the manifest just
+# before it expired can still read them
+CHUNK_GRACE_TIME = 60
+
+
+class ReportStorageError(Exception):
+    pass
+
+
+def _chunk_key(key, version, inx):
+    return "{}-{}-{}".format(key, version, inx)
+
+
+def set_report(key, blob, timeout, compress=True):
+    """
+        Compress the report (unless it is already compressed) and store it
+        splitted in chunks, under a new version. The manifest (key) is
+        written last, so readers see either the previous version or the
+        complete new one. The chunks of the previous version expire after
+        CHUNK_GRACE_TIME.
+        Return the manifest, with the stored sizes.
+    """
+    previous = cache.get(key)
+    compressed = zlib.compress(blob) if compress else blob
+    version = uuid4().hex
+    n_chunks = max((len(compressed) + CHUNK_SIZE - 1) // CHUNK_SIZE, 1)
+    chunks = {
+        _chunk_key(key, version, inx): compressed[inx * CHUNK_SIZE:(inx + 1) * CHUNK_SIZE]
+        for inx in range(n_chunks)
+    }
+    failed_keys = cache.set_many(chunks, timeout + CHUNK_GRACE_TIME)
+    if failed_keys:
+        raise ReportStorageError("Error storing {} chunks of {}".format(len(failed_keys), key))
+    manifest = {
+        'version': version,
+        'chunks': n_chunks,
+        'size': len(blob),
+        'compressed_size': len(compressed),
+        'checksum': zlib.crc32(compressed),
+        'compressed': compress,
+        'created': time.time(),
+    }
+    cache.set(key, manifest, timeout)
+    if previous is not None:
+        _expire_chunks(key, previous, CHUNK_GRACE_TIME)
+    logger.info(
+        "EolInstructor - Stored %s: %s bytes, %s compressed in %s chunks",
+        key, manifest['size'], manifest['compressed_size'], n_chunks)
+    return manifest
+
+
+def _expire_chunks(key, manifest, timeout):
+    for inx in range(manifest['chunks']):
+        cache.touch(_chunk_key(key, manifest['version'], inx), timeout)
+
+
+def expire_report(key, timeout=CHUNK_GRACE_TIME):
+    """
+        Shorten the life of the stored report to timeout seconds (its chunks
+        CHUNK_GRACE_TIME more), when it is replaced by another key
+    """
+    manifest = cache.get(key)
+    if manifest is None:
+        return
+    cache.touch(key, timeout)
+    _expire_chunks(key, manifest, timeout + CHUNK_GRACE_TIME)
+
+
+def delete_report(key):
+    """
+        Delete the stored report and its chunks
+    """
+    manifest = cache.get(key)
+    if manifest is None:
+        return
+    cache.delete(key)
+    cache.delete_many([_chunk_key(key, manifest['version'], inx) for inx in range(manifest['chunks'])])
+
+
+def get_report_manifest(key):
+    """
+        Return the manifest of the stored report or None
+    """
+    return cache.get(key)
+
+
+def get_report(key, manifest=None):
+    """
+        Return the stored report or None when it is missing, expired or
+        some of its chunks were evicted
+    """
+    manifest = manifest or cache.get(key)
+    if manifest is None:
+        return None
+    keys = [_chunk_key(key, manifest['version'], inx) for inx in range(manifest['chunks'])]
+    chunks = cache.get_many(keys)
+    if len(chunks) != len(keys):
+        logger.warning("EolInstructor - Missing chunks of %s", key)
+        return None
+    compressed = b''.join(chunks[x] for x in keys)
+    if zlib.crc32(compressed) != manifest['checksum']:
+        logger.warning("EolInstructor - Invalid checksum of %s", key)
+        return None
+    if not manifest.get('compressed', True):
+        return compressed
+    return zlib.decompress(compressed)
@@ -1,2 +1,4 @@
 def plugin_settings(settings):
     settings.EOL_INSTRUCTOR_TIME_CACHE = 300
+    settings.EOL_INSTRUCTOR_GRADES_RECONCILE_TIME = 3600
+    settings.EOL_INSTRUCTOR_COMPLETION_BITSET_TIME = 3600
\ No newline at end of file
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from common.djangoapps.student.models import CourseAccessRole, CourseEnrollment
+from completion.models import BlockCompletion
+from lms.djangoapps.certificates.models import GeneratedCertificate
+from lms.djangoapps.certificates.models import CertificateGenerationCourseSetting
+from lms.djangoapps.grades.models import PersistentSubsectionGrade
+from opaque_keys.edx.keys import CourseKey
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from openedx.core.djangoapps.course_groups.models import CourseCohortsSettings
+from . import stages, utils
+
+logger = logging.getLogger(__name__)
+
+@receiver(post_save, sender=PersistentSubsectionGrade)
+def update_grade_aggregates(sender, instance, **kwargs):
+    """
+        Update the cached grade summary aggregates with the saved grade,
+        once it is committed
+    """
+    percent_grade = None
+    if instance.first_attempted is not None and instance.possible_graded > 0:
+        percent_grade = (instance.earned_graded/instance.possible_graded)*100
+    stages.bump_generation(utils.GRADES_GENERATION, instance.course_id)
+    transaction.on_commit(partial(_update_grade_aggregate, instance.course_id, instance.usage_key, instance.user_id, percent_grade))
+
+def _update_grade_aggregate(course_key, usage_key, user_id, percent_grade):
+    try:
+        utils.update_grade_aggregate(course_key, usage_key, user_id, percent_grade)
+    except Exception:
+        # Never break the grade update, the aggregates are rebuilt periodically
+        logger.exception("EolInstructor - Error updating grade aggregates of %s", str(course_key))
+
+@receiver(post_save, sender=BlockCompletion)
+def update_completion_bitset(sender, instance, **kwargs):
+    """
+        Update the cached completion bitsets of the course with the saved
+        completion, once it is committed
+    """
+    stages.bump_generation(utils.COMPLETION_GENERATION, instance.context_key)
+    transaction.on_commit(partial(_update_completion_bitset, instance.context_key, instance.block_key, instance.user_id, instance.completion == 1.0))
+
+def _update_completion_bitset(course_key, block_key, user_id, completed):
+    try:
+        utils.update_completion_bitset(course_key, block_key, user_id, completed)
+    except Exception:
+        logger.exception("EolInstructor - Error updating completion bitset of %s", str(course_key))
+
+@receiver(post_save, sender=CourseEnrollment)
+@receiver(post_delete, sender=CourseEnrollment)
+@receiver(post_save, sender=CourseAccessRole)
+@receiver(post_delete, sender=CourseAccessRole)
+def clear_course_metrics(sender, instance, **kwargs):
+    """
+        Enrollments and course roles changed, the course metrics are outdated
+    """
+    # Org level roles have no course
+    if not isinstance(instance.course_id, CourseKey):
+        return
+    try:
+        utils.clear_course_metrics(instance.course_id)
+    except Exception:
+        logger.exception("EolInstructor - Error clearing course metrics of %s", str(instance.course_id))
+
+@receiver(post_save, sender=CourseOverview)
+@receiver(post_save, sender=CourseCohortsSettings)
+def clear_course_settings(sender, instance, **kwargs):
+    """
+        The course overview or the cohorts config changed, the settings
+        snapshot is outdated
+    """
+    utils.clear_course_settings(instance.id if sender is CourseOverview else instance.course_id)
+
+@receiver(post_save, sender=CertificateGenerationCourseSetting)
+def clear_course_settings_certificates(sender, instance, **kwargs):
+    """
+        The certificates config of the course changed
+    """
+    utils.clear_course_settings(instance.course_key)
+
+@receiver(post_save, sender=GeneratedCertificate)
+@receiver(post_delete, sender=GeneratedCertificate)
+def bump_certificates_generation(sender, instance, **kwargs):
+    """
+        The certificates of the course changed
+    """
+    stages.bump_generation(utils.CERTIFICATES_GENERATION, instance.course_id)
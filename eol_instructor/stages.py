@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import pickle
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from uuid import uuid4
+from .report_storage import expire_report, get_report, set_report
+
+# The reports are computed from named stages (enrollment snapshot,
+# certificate set, grade matrix, completion matrix...), each one cached
+# under its name and the versions of the data it is computed from, e.g.
+# the grade matrix depends on the enrollment and grades generations and on
+# the course structure version. A generation is a random token replaced
+# when its data changes, so a new structure version only recomputes the
+# stages that depend on the structure.
+STAGE_KEY = "eol_instructor_stage-{}-{}-{}"
+# Last stored output of each stage, the previous one expires when it is
+# replaced
+STAGE_CURRENT_KEY = "eol_instructor_stage-{}-{}"
+GENERATION_KEY = "eol_instructor_generation-{}-{}"
+GENERATION_TIME = 86400
+# The generations are bumped by signals, data written without them (bulk
+# updates, other services) is seen when the stage expires, so stages live
+# at most the soft timeout of the reports
+STAGE_TIME = 300
+
+if hasattr(settings, 'EOL_INSTRUCTOR_TIME_CACHE'):
+    STAGE_TIME = settings.EOL_INSTRUCTOR_TIME_CACHE
+if hasattr(settings, 'EOL_INSTRUCTOR_GRADES_TIME_CACHE'):
+    STAGE_TIME = min(STAGE_TIME, settings.EOL_INSTRUCTOR_GRADES_TIME_CACHE)
+if hasattr(settings, 'EOL_INSTRUCTOR_COMPLETION_TIME_CACHE'):
+    STAGE_TIME = min(STAGE_TIME, settings.EOL_INSTRUCTOR_COMPLETION_TIME_CACHE)
+
+
+def get_generation(name, course_key):
+    """
+        Return the current generation of the data of the course
+    """
+    key = GENERATION_KEY.format(name, course_key)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid4().hex
+        if not cache.add(key, generation, GENERATION_TIME):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_generation(name, course_key):
+    """
+        The data of the course changed, the stages computed from it are
+        outdated once the transaction is committed
+    """
+    transaction.on_commit(lambda: cache.set(GENERATION_KEY.format(name, course_key), uuid4().hex, GENERATION_TIME))
+
+
+def get_stage(name, course_key, dependencies, compute, timeout=STAGE_TIME):
+    """
+        Return the cached output of the stage for the dependencies, or
+        compute and cache it. Outputs are pickled and stored in chunks,
+        so they can be bigger than a cache item. The output for the
+        previous dependencies expires once it is replaced.
+    """
+    dependencies = hashlib.md5('-'.join(str(x) for x in dependencies).encode('utf-8')).hexdigest()
+    key = STAGE_KEY.format(name, course_key, dependencies)
+    blob = get_report(key)
+    if blob is not None:
+        return pickle.loads(blob)
+    output = compute()
+    set_report(key, pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL), timeout)
+    current_key = STAGE_CURRENT_KEY.format(name, course_key)
+    previous = cache.get(current_key)
+    cache.set(current_key, key, timeout)
+    if previous is not None and previous != key:
+        expire_report(previous)
+    return output
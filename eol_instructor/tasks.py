@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import gzip
+import json
 import logging
 from django.conf import settings
 from datetime import datetime
@@ -9,26 +11,336 @@ from opaque_keys import InvalidKeyError
 from django.contrib.auth.models import User
 from collections import OrderedDict, defaultdict, deque
 
-from celery import current_task, task
+from celery import chord, current_task, task
+from celery.states import FAILURE, READY_STATES, SUCCESS
 from lms.djangoapps.instructor_task.tasks_base import BaseInstructorTask
 from lms.djangoapps.instructor_task.api_helper import submit_task
+from lms.djangoapps.instructor_task.models import InstructorTask
 from functools import partial
 from time import time
 from lms.djangoapps.instructor_task.tasks_helper.runner import run_main_task, TaskProgress
 from django.db import IntegrityError, transaction
 from django.utils.translation import ugettext_noop
 from pytz import UTC
-from .utils import get_all_persistant_grades, get_course_grade_summary, get_completion_course
+from datetime import timedelta
+from django.utils.timezone import now
+from uuid import uuid4
+from .report_codec import encode_grades_report, encode_completion_report, encode_row_hashes, decode_report, get_row_hashes
+from .models import ReportAccess
+from .report_storage import delete_report, expire_report, get_report_manifest, set_report
+from .utils import backfill_learner_activity, get_activity_backfill_courses, get_report_access_score, rollup_learner_activity, get_all_persistant_grades, get_course_grade_summary, get_completion_course, get_grades_sort_index
+from .utils import _get_completion_students, _get_enrolled_grades_users, get_completion_partial, get_grades_partial, merge_completion_partials, merge_grades_partials, start_grade_aggregates
 
 logger = logging.getLogger(__name__)
 
+# Courses with more students are computed in shards of LIMIT_STUDENTS
+# students, in parallel
 LIMIT_STUDENTS = 10000
+# The refresh lock of a sharded report is kept until the shards are merged
+SHARDS_LOCK_TIME = 3600
+# Progress and partial results of the running computations
+PROGRESS_TIME = 3600
 TIME_CACHE  = 300
 
 if hasattr(settings, 'EOL_INSTRUCTOR_TIME_CACHE'):
     TIME_CACHE = settings.EOL_INSTRUCTOR_TIME_CACHE 
+if hasattr(settings, 'EOL_INSTRUCTOR_LIMIT_STUDENTS'):
+    LIMIT_STUDENTS = settings.EOL_INSTRUCTOR_LIMIT_STUDENTS
 
-@task(base=BaseInstructorTask, queue='edx.lms.core.low')
+# Reports older than the soft time are served as stale while they are
+# refreshed, they are deleted after the hard time
+GRADES_TIME_CACHE = TIME_CACHE
+COMPLETION_TIME_CACHE = TIME_CACHE
+GRADES_HARD_TIME_CACHE = 86400
+COMPLETION_HARD_TIME_CACHE = 86400
+
+if hasattr(settings, 'EOL_INSTRUCTOR_GRADES_TIME_CACHE'):
+    GRADES_TIME_CACHE = settings.EOL_INSTRUCTOR_GRADES_TIME_CACHE
+if hasattr(settings, 'EOL_INSTRUCTOR_COMPLETION_TIME_CACHE'):
+    COMPLETION_TIME_CACHE = settings.EOL_INSTRUCTOR_COMPLETION_TIME_CACHE
+if hasattr(settings, 'EOL_INSTRUCTOR_GRADES_HARD_TIME_CACHE'):
+    GRADES_HARD_TIME_CACHE = settings.EOL_INSTRUCTOR_GRADES_HARD_TIME_CACHE
+if hasattr(settings, 'EOL_INSTRUCTOR_COMPLETION_HARD_TIME_CACHE'):
+    COMPLETION_HARD_TIME_CACHE = settings.EOL_INSTRUCTOR_COMPLETION_HARD_TIME_CACHE
+
+# Previous versions of a report can be sent as deltas for DELTA_TIME
+DELTA_TIME = 3600
+
+# Computations without progress in RUNNING_TIMEOUT seconds are not running
+RUNNING_TIMEOUT = 300
+
+# Computations without progress in LOST_TIMEOUT seconds were lost (the
+# worker died or the chord of the shards never ended), they are failed
+LOST_TIMEOUT = 1800
+
+if hasattr(settings, 'EOL_INSTRUCTOR_LOST_TIMEOUT'):
+    LOST_TIMEOUT = settings.EOL_INSTRUCTOR_LOST_TIMEOUT
+
+# Only one refresh of a stale or missing report is submitted at a time
+REFRESH_LOCK_TIME = 60
+
+# Each pre-warm run (every PREWARM_INTERVAL seconds) refreshes the reports
+# that would be stale before the next run, viewed in the last PREWARM_DAYS,
+# at most PREWARM_CONCURRENCY reports and PREWARM_TIME_BUDGET seconds of
+# estimated computation
+PREWARM_INTERVAL = 60
+PREWARM_CONCURRENCY = 2
+PREWARM_TIME_BUDGET = 600
+PREWARM_DAYS = 7
+
+if hasattr(settings, 'EOL_INSTRUCTOR_PREWARM_INTERVAL'):
+    PREWARM_INTERVAL = settings.EOL_INSTRUCTOR_PREWARM_INTERVAL
+if hasattr(settings, 'EOL_INSTRUCTOR_PREWARM_CONCURRENCY'):
+    PREWARM_CONCURRENCY = settings.EOL_INSTRUCTOR_PREWARM_CONCURRENCY
+if hasattr(settings, 'EOL_INSTRUCTOR_PREWARM_TIME_BUDGET'):
+    PREWARM_TIME_BUDGET = settings.EOL_INSTRUCTOR_PREWARM_TIME_BUDGET
+if hasattr(settings, 'EOL_INSTRUCTOR_PREWARM_DAYS'):
+    PREWARM_DAYS = settings.EOL_INSTRUCTOR_PREWARM_DAYS
+
+# Seconds of each activity rollup run spent adding the history of the courses
+ACTIVITY_BACKFILL_TIME_BUDGET = 300
+
+if hasattr(settings, 'EOL_INSTRUCTOR_ACTIVITY_BACKFILL_TIME_BUDGET'):
+    ACTIVITY_BACKFILL_TIME_BUDGET = settings.EOL_INSTRUCTOR_ACTIVITY_BACKFILL_TIME_BUDGET
+
+class EolReportTask(BaseInstructorTask):
+    """
+        InstructorTask of a report, sharded reports are still running when
+        the task returns
+    """
+    abstract = True
+
+    def on_success(self, task_progress, task_id, args, kwargs):
+        if task_progress.get('sharded'):
+            return
+        super(EolReportTask, self).on_success(task_progress, task_id, args, kwargs)
+
+GRADES_TASK_TYPE = 'EOL_Instructor_Grades'
+COMPLETION_TASK_TYPE = 'EOL_Instructor_Completion'
+
+def get_grades_report_key(course_id):
+    return "eol_grades-" + str(course_id) + "-data"
+
+def get_completion_report_key(course_id):
+    return "eol_completion_instructor-" + str(course_id) + "-data"
+
+def set_progress(key, step, done=0, total=0, task_progress=None):
+    """
+        Save the progress of the report computation (read by the status
+        endpoint) and update the state of the InstructorTask, if any
+    """
+    cache.set(key + "-progress", {'step': step, 'done': done, 'total': total, 'updated': time()}, PROGRESS_TIME)
+    if task_progress is not None:
+        task_progress.total = total
+        task_progress.attempted = task_progress.succeeded = done
+        task_progress.update_task_state(extra_meta={'step': step})
+
+def get_progress(key):
+    return cache.get(key + "-progress")
+
+def set_heartbeat(key):
+    """
+        A shard of the report computed a chunk of students
+    """
+    cache.set(key + "-heartbeat", time(), PROGRESS_TIME)
+
+def is_running(key, progress=None):
+    """
+        Check if the report is being computed: its progress is not finished
+        and was updated (or a shard advanced) in the last RUNNING_TIMEOUT
+        seconds
+    """
+    progress = progress or get_progress(key)
+    if progress is None or progress['step'] in ('done', 'failed'):
+        return False
+    return time() - max(progress['updated'], cache.get(key + "-heartbeat", 0)) < RUNNING_TIMEOUT
+
+def set_shard_done(key, n_shards):
+    """
+        Count a computed shard in the progress of the report
+    """
+    try:
+        done = cache.incr(key + "-shards")
+    except ValueError:
+        done = 0
+    set_progress(key, 'shards', done, n_shards)
+
+def start_shards(key, n_shards, task_progress=None):
+    cache.set(key + "-refresh", True, SHARDS_LOCK_TIME)
+    cache.set(key + "-shards", 0, PROGRESS_TIME)
+    set_progress(key, 'shards', 0, n_shards, task_progress)
+
+def get_report_body_key(key, version):
+    return key + "-json-" + version
+
+def get_row_hashes_key(key, version):
+    return key + "-rows-" + version
+
+def store_report_body(key, manifest, blob, timeout, previous=None):
+    """
+        Store the json response of the report gzipped and the hash of each
+        learner row, next to the report and bound to its version, so it is
+        served without decoding it and the next versions can be sent as
+        deltas. The body of the previous version (manifest) expires, its
+        row hashes are kept DELTA_TIME for the deltas.
+    """
+    data = decode_report(blob)
+    set_report(get_row_hashes_key(key, manifest['version']), encode_row_hashes(get_row_hashes(data)), timeout)
+    data['created'] = manifest['created']
+    data['report_version'] = manifest['version']
+    body = gzip.compress(json.dumps(data).encode('utf-8'))
+    set_report(get_report_body_key(key, manifest['version']), body, timeout, compress=False)
+    if previous is not None:
+        expire_report(get_report_body_key(key, previous['version']))
+        expire_report(get_row_hashes_key(key, previous['version']), min(DELTA_TIME, timeout))
+
+def get_shards(items):
+    """
+        Split the items in the fewest shards of at most LIMIT_STUDENTS
+        items, all of the same size (+-1)
+    """
+    n_shards = (len(items) + LIMIT_STUDENTS - 1) // LIMIT_STUDENTS
+    return [items[inx * len(items) // n_shards:(inx + 1) * len(items) // n_shards] for inx in range(n_shards)]
+
+def end_instructor_task(entry_id, output=None, exc=None):
+    """
+        Save the result of the InstructorTask of a sharded report, once its
+        shards are merged (output) or one of them failed (exc)
+    """
+    if entry_id is None:
+        return
+    entry = InstructorTask.objects.get(pk=entry_id)
+    if exc is None:
+        output['duration_ms'] = int((now() - entry.created).total_seconds() * 1000)
+        entry.task_output = InstructorTask.create_output_for_success(output)
+        entry.task_state = SUCCESS
+    else:
+        entry.task_output = InstructorTask.create_output_for_failure(exc, None)
+        entry.task_state = FAILURE
+    entry.save_now()
+
+def fail_report(key):
+    """
+        The computation of the report failed, release its lock and remove
+        its partial results
+    """
+    end_refresh(key)
+    delete_report(key + "-partial")
+    set_progress(key, 'failed')
+
+def get_task_output(n_students, manifest, step):
+    return {
+        'action_name': 'generated',
+        'attempted': n_students,
+        'succeeded': n_students,
+        'skipped': 0,
+        'failed': 0,
+        'total': n_students,
+        'step': step,
+        'size': manifest['size'],
+        'compressed_size': manifest['compressed_size'],
+    }
+
+def generate_grades_report(course_key, task_progress=None, entry_id=None):
+    """
+        Compute and store the eol_grades report, return its manifest.
+        The summary is published first (key-partial), while the students
+        grades are read.
+        Courses with more than LIMIT_STUDENTS students are computed by a
+        chord of shards, then None is returned and the report is stored
+        by merge_grades_shards (which ends the InstructorTask entry_id).
+    """
+    key = get_grades_report_key(course_key)
+    try:
+        user_ids, usernames = _get_enrolled_grades_users(course_key)
+        set_progress(key, 'summary', 0, len(user_ids), task_progress)
+        summary = get_course_grade_summary(None, course_key)
+        times = datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
+        set_report(key + "-partial", json.dumps({'summary': summary, 'time': times}).encode('utf-8'), PROGRESS_TIME)
+        if len(user_ids) > LIMIT_STUDENTS:
+            shards = list(zip(get_shards(user_ids), get_shards(usernames)))
+            start_shards(key, len(shards), task_progress)
+            aggregates_version = start_grade_aggregates(course_key)
+            chord(process_grades_shard.s(str(course_key), x, y, len(shards)) for x, y in shards)(
+                merge_grades_shards.s(str(course_key), aggregates_version, entry_id).on_error(
+                    fail_report_shards.s(report='grades', course_id=str(course_key), entry_id=entry_id)))
+            return None
+        details = get_all_persistant_grades(
+            None,
+            course_key,
+            progress=lambda done, total: set_progress(key, 'grades', done, total, task_progress))
+        return store_grades_report(course_key, details, summary)
+    except Exception:
+        fail_report(key)
+        raise
+
+def store_grades_report(course_key, details, summary=None):
+    """
+        Add the summary to the grades details and store the report
+    """
+    key = get_grades_report_key(course_key)
+    data = {
+        'details': details,
+        'summary': summary if summary is not None else get_course_grade_summary(None, course_key)
+    }
+
+    times = datetime.now()
+    times = times.strftime("%d/%m/%Y, %H:%M:%S")
+    data['time'] = times
+    data['time_queue'] = str(GRADES_TIME_CACHE / 60)
+    data['version'] = uuid4().hex
+    blob = encode_grades_report(data, get_grades_sort_index(data['details']))
+    previous = get_report_manifest(key)
+    manifest = set_report(key, blob, max(GRADES_HARD_TIME_CACHE, GRADES_TIME_CACHE))
+    store_report_body(key, manifest, blob, max(GRADES_HARD_TIME_CACHE, GRADES_TIME_CACHE), previous)
+    delete_report(key + "-partial")
+    set_progress(key, 'done', len(details['data']), len(details['data']))
+    return manifest
+
+def generate_completion_report(course_key, task_progress=None, entry_id=None):
+    """
+        Compute and store the eol_completion report, return its manifest.
+        Courses with more than LIMIT_STUDENTS students are computed by a
+        chord of shards, then None is returned and the report is stored
+        by merge_completion_shards (which ends the InstructorTask entry_id).
+    """
+    key = get_completion_report_key(course_key)
+    try:
+        enrolled_students = _get_completion_students(course_key)
+        set_progress(key, 'completion', 0, len(enrolled_students), task_progress)
+        if len(enrolled_students) > LIMIT_STUDENTS:
+            shards = get_shards(enrolled_students)
+            start_shards(key, len(shards), task_progress)
+            chord(process_completion_shard.s(str(course_key), x, len(shards)) for x in shards)(
+                merge_completion_shards.s(str(course_key), len(enrolled_students), entry_id).on_error(
+                    fail_report_shards.s(report='completion', course_id=str(course_key), entry_id=entry_id)))
+            return None
+        data = get_completion_course(
+            course_key,
+            progress=lambda done, total: set_progress(key, 'completion', done, total, task_progress))
+        return store_completion_report(course_key, data)
+    except Exception:
+        fail_report(key)
+        raise
+
+def store_completion_report(course_key, data):
+    """
+        Store the completion report
+    """
+    key = get_completion_report_key(course_key)
+    times = datetime.now()
+    times = times.strftime("%d/%m/%Y, %H:%M:%S")
+    data['time'] = times
+    data['time_queue'] = str(COMPLETION_TIME_CACHE / 60)
+    blob = encode_completion_report(data)
+    previous = get_report_manifest(key)
+    manifest = set_report(key, blob, max(COMPLETION_HARD_TIME_CACHE, COMPLETION_TIME_CACHE))
+    store_report_body(key, manifest, blob, max(COMPLETION_HARD_TIME_CACHE, COMPLETION_TIME_CACHE), previous)
+    n_rows = len(data['data']) if data['data'] != [[True]] else 0
+    set_progress(key, 'done', n_rows, n_rows)
+    return manifest
+
+@task(base=EolReportTask, queue='edx.lms.core.low')
 def process_eolgrades(entry_id, xmodule_instance_args):
     action_name = ugettext_noop('generated')
     task_fn = partial(task_get_eolgrades, xmodule_instance_args)
@@ -49,32 +361,23 @@ def task_get_eolgrades(
         action_name,
         1,
         start_time)
-    
-    username = task_input["username"]
-    user = User.objects.get(username=username)
-    data = {
-        'details': get_all_persistant_grades(user, course_key),
-        'summary': get_course_grade_summary(user, course_key)
-    }
 
-    times = datetime.now()
-    times = times.strftime("%d/%m/%Y, %H:%M:%S")
-    data['time'] = times
-    data['time_queue'] = str(TIME_CACHE / 60)
-    current_step = {'step': 'Uploading Data Eol Grades'}
-    cache.set(
-        "eol_grades-" +
-        str(course_id) +
-        "-data",
-        data,
-        TIME_CACHE)
+    manifest = generate_grades_report(course_key, task_progress, _entry_id)
+    if manifest is None:
+        # The InstructorTask is ended by the merge of the shards
+        return {'step': 'Computing Eol Grades shards', 'sharded': True}
+    current_step = {
+        'step': 'Uploading Data Eol Grades',
+        'size': manifest['size'],
+        'compressed_size': manifest['compressed_size']
+    }
 
     return task_progress.update_task_state(extra_meta=current_step)
 
 
 def task_process_eolgrades(request, course_id):
     course_key = CourseKey.from_string(course_id)
-    task_type = 'EOL_Instructor_Grades'
+    task_type = GRADES_TASK_TYPE
     task_class = process_eolgrades
     task_input = {'username': request.user.username}
     task_key = course_id
@@ -87,7 +390,7 @@ def task_process_eolgrades(request, course_id):
         task_input,
         task_key)
 
-@task(base=BaseInstructorTask, queue='edx.lms.core.low')
+@task(base=EolReportTask, queue='edx.lms.core.low')
 def process_eolcompletion(entry_id, xmodule_instance_args):
     action_name = ugettext_noop('generated')
     task_fn = partial(task_get_eolcompletion, xmodule_instance_args)
@@ -108,25 +411,22 @@ def task_get_eolcompletion(
         action_name,
         1,
         start_time)
-    
-    data = get_completion_course(course_key)
-    times = datetime.now()
-    times = times.strftime("%d/%m/%Y, %H:%M:%S")
-    data['time'] = times
-    data['time_queue'] = str(TIME_CACHE / 60)
-    current_step = {'step': 'Uploading Data Eol Completion'}
-    cache.set(
-        "eol_completion_instructor-" +
-        str(course_id) +
-        "-data",
-        data,
-        TIME_CACHE)
+
+    manifest = generate_completion_report(course_key, task_progress, _entry_id)
+    if manifest is None:
+        # The InstructorTask is ended by the merge of the shards
+        return {'step': 'Computing Eol Completion shards', 'sharded': True}
+    current_step = {
+        'step': 'Uploading Data Eol Completion',
+        'size': manifest['size'],
+        'compressed_size': manifest['compressed_size']
+    }
 
     return task_progress.update_task_state(extra_meta=current_step)
 
 def task_process_eolcompletion(request, course_id):
     course_key = CourseKey.from_string(course_id)
-    task_type = 'EOL_Instructor_Completion'
+    task_type = COMPLETION_TASK_TYPE
     task_class = process_eolcompletion
     task_input = {}
     task_key = course_id
@@ -137,4 +437,176 @@ def task_process_eolcompletion(request, course_id):
         task_class,
         course_key,
         task_input,
-        task_key)
\ No newline at end of file
+        task_key)
+
+@task(queue='edx.lms.core.low')
+def process_activity_rollup():
+    """
+        Periodic task, add the new learner activity to the daily rollup and
+        then the history of the courses, ACTIVITY_BACKFILL_TIME_BUDGET
+        seconds per run
+    """
+    n_days = rollup_learner_activity()
+    logger.info("EolInstructor - Activity rollup updated %s course days", n_days)
+    deadline = time() + ACTIVITY_BACKFILL_TIME_BUDGET
+    for course_id in get_activity_backfill_courses():
+        if time() >= deadline:
+            break
+        if backfill_learner_activity(course_id, deadline - time()):
+            logger.info("EolInstructor - Activity history added, course: {}".format(course_id))
+    return n_days
+
+REPORTS = {
+    'grades': (get_grades_report_key, generate_grades_report, GRADES_TIME_CACHE),
+    'completion': (get_completion_report_key, generate_completion_report, COMPLETION_TIME_CACHE),
+}
+
+REPORTS_TASK_TYPE = {
+    'grades': GRADES_TASK_TYPE,
+    'completion': COMPLETION_TASK_TYPE,
+}
+
+@task(queue='edx.lms.core.low')
+def prewarm_reports():
+    """
+        Periodic task, refresh the most viewed reports before they are stale.
+        Reports are prioritized by decayed views and then by size, the
+        pre-warms still running count against PREWARM_CONCURRENCY.
+    """
+    candidates = []
+    current = now()
+    accesses = list(ReportAccess.objects.filter(last_access__gte=current - timedelta(days=PREWARM_DAYS), report__in=REPORTS.keys()))
+    # Pre-warms submitted by previous runs that are still computing
+    running = len(cache.get_many([REPORTS[x.report][0](x.course_id) + "-prewarm" for x in accesses]))
+    for access in accesses:
+        get_key, generate, soft_timeout = REPORTS[access.report]
+        manifest = get_report_manifest(get_key(access.course_id))
+        if manifest is not None and time() - manifest['created'] + PREWARM_INTERVAL < soft_timeout:
+            continue
+        candidates.append((get_report_access_score(access, current), manifest['size'] if manifest is not None else 0, access))
+    candidates.sort(key=lambda x: x[:2], reverse=True)
+    budget = PREWARM_TIME_BUDGET
+    submitted = []
+    for score, size, access in candidates:
+        if running + len(submitted) >= PREWARM_CONCURRENCY:
+            break
+        duration = access.duration or 0
+        key = REPORTS[access.report][0](access.course_id)
+        if duration > budget or not cache.add(key + "-refresh", True, int(max(2 * duration, REFRESH_LOCK_TIME))):
+            continue
+        cache.set(key + "-prewarm", True, SHARDS_LOCK_TIME)
+        budget -= duration
+        prewarm_report.delay(access.report, str(access.course_id))
+        submitted.append(key)
+    logger.info("EolInstructor - Pre-warming %s of %s expiring reports (%s running): %s", len(submitted), len(candidates), running, submitted)
+    return len(submitted)
+
+def end_refresh(key):
+    """
+        Release the refresh lock of the report and its pre-warm slot
+    """
+    cache.delete_many([key + "-refresh", key + "-prewarm"])
+
+@task(queue='edx.lms.core.low')
+def prewarm_report(report, course_id):
+    """
+        Compute a report from prewarm_reports and save how long it took
+    """
+    course_key = CourseKey.from_string(course_id)
+    get_key, generate, soft_timeout = REPORTS[report]
+    start_time = time()
+    # A failed report releases the lock, a sharded one keeps it until
+    # its shards are merged
+    manifest = generate(course_key)
+    if manifest is not None:
+        end_refresh(get_key(course_key))
+        ReportAccess.objects.filter(course_id=course_key, report=report).update(duration=time() - start_time)
+
+@task(queue='edx.lms.core.low')
+def process_grades_shard(course_id, user_ids, usernames, n_shards):
+    """
+        Compute the grades of a shard of students
+    """
+    key = get_grades_report_key(course_id)
+    partial = get_grades_partial(CourseKey.from_string(course_id), user_ids, usernames, progress=lambda done, total: set_heartbeat(key))
+    set_shard_done(key, n_shards)
+    return partial
+
+@task(queue='edx.lms.core.low')
+def merge_grades_shards(partials, course_id, aggregates_version=None, entry_id=None):
+    """
+        Merge the grades shards, store the report and end its InstructorTask
+    """
+    course_key = CourseKey.from_string(course_id)
+    try:
+        details = merge_grades_partials(course_key, partials, aggregates_version)
+        manifest = store_grades_report(course_key, details)
+    finally:
+        end_refresh(get_grades_report_key(course_key))
+    end_instructor_task(entry_id, get_task_output(len(details['data']), manifest, 'Uploading Data Eol Grades'))
+    logger.info("EolInstructor - Merged %s grades shards of %s", len(partials), course_id)
+    return manifest['size']
+
+@task(queue='edx.lms.core.low')
+def process_completion_shard(course_id, students, n_shards):
+    """
+        Compute the completion of a shard of students
+    """
+    key = get_completion_report_key(course_id)
+    partial = get_completion_partial(CourseKey.from_string(course_id), students, progress=lambda done, total: set_heartbeat(key))
+    set_shard_done(key, n_shards)
+    return partial
+
+@task(queue='edx.lms.core.low')
+def merge_completion_shards(partials, course_id, n_students, entry_id=None):
+    """
+        Merge the completion shards, store the report and end its
+        InstructorTask
+    """
+    course_key = CourseKey.from_string(course_id)
+    try:
+        manifest = store_completion_report(course_key, merge_completion_partials(partials, n_students))
+    finally:
+        end_refresh(get_completion_report_key(course_key))
+    end_instructor_task(entry_id, get_task_output(n_students, manifest, 'Uploading Data Eol Completion'))
+    logger.info("EolInstructor - Merged %s completion shards of %s", len(partials), course_id)
+    return manifest['size']
+
+@task(queue='edx.lms.core.low')
+def fail_report_shards(*args, report=None, course_id=None, entry_id=None):
+    """
+        Errback of the merge of the shards (called with the id of the merge
+        when a shard failed, or with the request, exception and traceback
+        when the merge failed): release the report lock and save the failure
+    """
+    key = REPORTS[report][0](course_id)
+    fail_report(key)
+    exc = next((x for x in args if isinstance(x, Exception)), None)
+    logger.error("EolInstructor - The shards of %s %s failed: %s", report, course_id, exc)
+    end_instructor_task(entry_id, exc=exc or Exception("A shard of the report failed"))
+
+def fail_lost_report(report, course_id):
+    """
+        Fail the computation of the report when it has no progress (or
+        shard heartbeat) in LOST_TIMEOUT seconds: release its lock and end
+        its unfinished InstructorTask, so it no longer blocks a refresh.
+        Return whether a lost computation was failed.
+    """
+    key = REPORTS[report][0](course_id)
+    progress = get_progress(key)
+    if progress is not None and (progress['step'] in ('done', 'failed') or time() - max(progress['updated'], cache.get(key + "-heartbeat", 0)) < LOST_TIMEOUT):
+        return False
+    # Recently submitted tasks may still be queued
+    entries = list(InstructorTask.objects.filter(
+        course_id=CourseKey.from_string(str(course_id)),
+        task_type=REPORTS_TASK_TYPE[report],
+        updated__lt=now() - timedelta(seconds=LOST_TIMEOUT)).exclude(
+        task_state__in=READY_STATES).values_list('id', flat=True))
+    if progress is None and len(entries) == 0:
+        return False
+    if progress is not None:
+        fail_report(key)
+    for entry_id in entries:
+        end_instructor_task(entry_id, exc=Exception("The report computation was lost"))
+    logger.error("EolInstructor - The computation of %s %s was lost, tasks: %s", report, course_id, entries)
+    return True
@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-from mock import patch, Mock, MagicMock
-from collections import namedtuple
+from mock import call, patch, Mock, MagicMock
+from collections import namedtuple, OrderedDict
 from django.urls import reverse
-from django.test import TestCase, Client
+from django.test import RequestFactory, TestCase, Client
 from django.test import Client
 from django.conf import settings
 from django.contrib.auth.models import Permission, User
@@ -14,8 +14,23 @@ from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore import ModuleStoreEnum
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
+from openedx.core.djangoapps.content.course_overviews.tests.factories import CourseOverviewFactory
 from common.djangoapps.student.tests.factories import CourseEnrollmentAllowedFactory, UserFactory, CourseEnrollmentFactory
 from common.djangoapps.student.roles import CourseInstructorRole, CourseStaffRole
+from datetime import timedelta
+from django.utils.timezone import now
+from opaque_keys.edx.keys import CourseKey
+from lms.djangoapps.instructor_task.models import InstructorTask
+from lms.djangoapps.grades.models import PersistentCourseGrade, PersistentSubsectionGrade, VisibleBlocks
+from statistics import mean, pstdev
+from completion.models import BlockCompletion
+from lms.djangoapps.courseware.models import StudentModule
+from . import report_codec, report_storage, stages, tasks, utils, views
+from .models import ActivityRollupWatermark, LearnerDailyActivity, ReportAccess
+import gzip
+import json
+import random
+import numpy as np
 
 
 class TestEOLInstructor(TestCase):
@@ -25,3 +40,837 @@ class TestEOLInstructor(TestCase):
 
     def test_test(self):
         self.assertEqual(101, 101)
+
+
+class TestGradeStatistics(TestCase):
+
+    def test_round_half_up_hundredths(self):
+        percents = [(earned/possible)*100 for possible in [3, 7, 8, 160] for earned in range(possible + 1)]
+        hundredths = utils.round_half_up_hundredths(percents)
+        self.assertEqual(list(hundredths / 100), [utils.round_half_up(x) for x in percents])
+
+    def test_get_grade_statistics(self):
+        grades = [28.57, 100.0, 16.88, 88.13, 66.67, 66.67, 0.0]
+        hundredths = utils.round_half_up_hundredths(grades)
+        statistics = utils.get_grade_statistics(np.bincount(hundredths), 10)
+        grades_range = [0]*21
+        for x in grades:
+            grades_range[int(x/5)] += 1
+        self.assertEqual(statistics, {
+            'avg': utils.round_half_up(mean(grades)),
+            'grades_range': grades_range,
+            'min': 0.0,
+            'max': 100.0,
+            'dev': utils.round_half_up(pstdev(grades)),
+            'len': 7,
+            'rate': 70.0
+        })
+
+    def test_get_grade_statistics_dev_ties(self):
+        for grades in [[8.33, 25.0], [28.57, 100.0], [61.54, 7.69]]:
+            statistics = utils.get_grade_statistics(np.bincount(utils.round_half_up_hundredths(grades)), len(grades))
+            self.assertEqual(statistics['dev'], utils.round_half_up(pstdev(grades)))
+
+    def test_get_grade_statistics_empty(self):
+        statistics = utils.get_grade_statistics(np.bincount([], minlength=1), 0)
+        self.assertEqual(statistics['len'], 0)
+        self.assertEqual(statistics['avg'], 0)
+        self.assertEqual(statistics['grades_range'], [0]*21)
+
+
+class TestGradeMatrix(TestCase):
+
+    def test_get_grade_matrix(self):
+        course_key = CourseKey.from_string('course-v1:eol+Matrix+1')
+        usage_keys = [course_key.make_usage_key('sequential', x) for x in ['s1', 's2']]
+        visible_blocks = VisibleBlocks.objects.create(blocks_json='[]', hashed='eol-matrix-1', course_id=course_key)
+        for user_id, usage_key, earned, possible, attempted in [
+                (1, usage_keys[0], 2, 3, True),
+                (1, usage_keys[1], 0, 0, True),
+                (2, usage_keys[1], 1, 4, True),
+                (2, usage_keys[0], 0, 5, False)]:
+            PersistentSubsectionGrade.objects.create(
+                user_id=user_id,
+                course_id=course_key,
+                usage_key=usage_key,
+                earned_all=earned,
+                possible_all=possible,
+                earned_graded=earned,
+                possible_graded=possible,
+                visible_blocks=visible_blocks,
+                first_attempted=now() if attempted else None)
+        matrix = utils.get_grade_matrix(course_key, [1, 2, 3], usage_keys)
+        not_attempted = utils.NOT_ATTEMPTED
+        self.assertEqual(matrix.tolist(), [[6667, not_attempted], [not_attempted, 2500], [not_attempted, not_attempted]])
+
+
+class TestCourseVersion(TestCase):
+
+    @patch('eol_instructor.utils.modulestore')
+    @patch('eol_instructor.utils.CourseOverview')
+    def test_get_course_version(self, course_overview, modulestore):
+        course_key = CourseKey.from_string('course-v1:eol+Version+1')
+        course_overview.get_from_id.return_value = Mock(modified=now())
+        modulestore.return_value.get_course.return_value = Mock(course_version='v1')
+        self.assertEqual(utils.get_course_version(course_key), 'v1')
+        modulestore.return_value.get_course.return_value = Mock(course_version='v2')
+        self.assertEqual(utils.get_course_version(course_key), 'v1')
+        # Publishing the course updates its overview
+        course_overview.get_from_id.return_value = Mock(modified=now() + timedelta(seconds=1))
+        self.assertEqual(utils.get_course_version(course_key), 'v2')
+
+
+class TestCourseSettings(TestCase):
+
+    @patch('eol_instructor.utils.cert_enabled', return_value=True)
+    @patch('eol_instructor.utils.is_course_cohorted', return_value=False)
+    @patch('eol_instructor.utils.get_list_xblocks', return_value=[])
+    @patch('eol_instructor.utils.get_graded_subsections_by_format', return_value={'Exam': ['a', 'b']})
+    @patch('cms.djangoapps.models.settings.course_grading.CourseGradingModel.fetch', return_value={})
+    @patch('eol_instructor.utils.modulestore')
+    @patch('eol_instructor.utils.CourseOverview')
+    def test_get_course_settings(self, course_overview, modulestore, fetch, get_graded_subsections_by_format, get_list_xblocks, is_course_cohorted, cert_enabled):
+        course_key = CourseKey.from_string('course-v1:eol+Settings+1')
+        course_overview.get_from_id.return_value = Mock(modified=now(), effort='5h', language='es', self_paced=False)
+        snapshot = utils.get_course_settings(course_key)
+        self.assertEqual(snapshot['n_grades_subsection'], {'Exam': 2})
+        self.assertFalse(snapshot['cohorted'])
+        is_course_cohorted.return_value = True
+        self.assertEqual(utils.get_course_settings(course_key), snapshot)
+        self.assertEqual(fetch.call_count, 1)
+        # The cohorts config was saved
+        utils.clear_course_settings(course_key)
+        self.assertTrue(utils.get_course_settings(course_key)['cohorted'])
+        self.assertEqual(fetch.call_count, 2)
+        # Publishing the course updates its overview
+        course_overview.get_from_id.return_value = Mock(modified=now() + timedelta(seconds=1), effort='6h', language='es', self_paced=False)
+        self.assertEqual(utils.get_course_settings(course_key)['course_data']['effort'], '6h')
+        self.assertEqual(fetch.call_count, 3)
+
+
+class TestGradesPage(TestCase):
+
+    def get_columns(self, labels, rows):
+        data = {
+            'details': {
+                'headers': [{'name': 'username', 'data': 'username', 'visible': True}] + [{'name': x, 'data': x, 'visible': True} for x in labels],
+                'data': rows
+            },
+            'summary': OrderedDict(('block-{}'.format(inx), {'grades': [50.0], 'format': x}) for inx, x in enumerate(labels)),
+            'version': 'v1'
+        }
+        blob = report_codec.encode_grades_report(data, utils.get_grades_sort_index(data['details']))
+        return report_codec.decode_grades_columns(blob), report_codec.decode_grades_index(blob)
+
+    def test_grade_types(self):
+        labels = ['Exam 1', 'Exam Final 1', 'Examen 1', 'Exam 2']
+        data, index = self.get_columns(labels, [dict({x: 50.0 for x in labels}, username='student')])
+        page = utils.get_grades_page(data, index, 10, grade_types=['Exam'])
+        self.assertEqual([x['data'] for x in page['headers']], ['username', 'Exam 1', 'Exam 2'])
+        self.assertEqual(page['data'], [{'username': 'student', 'Exam 1': 50.0, 'Exam 2': 50.0}])
+        self.assertEqual([x['format'] for x in page['summary'].values()], ['Exam 1', 'Exam 2'])
+        page = utils.get_grades_page(data, index, 10, grade_types=['Exam Final'])
+        self.assertEqual([x['data'] for x in page['headers']], ['username', 'Exam Final 1'])
+
+    def test_sorted_page(self):
+        rows = [
+            {'username': 'c', 'Exam 1': 25.0},
+            {'username': 'a', 'Exam 1': 0},
+            {'username': 'b', 'Exam 1': 75.5},
+        ]
+        data, index = self.get_columns(['Exam 1'], rows)
+        page = utils.get_grades_page(data, index, 2, sort='Exam 1', reverse=True)
+        self.assertEqual(page['data'], [{'username': 'b', 'Exam 1': 75.5}, {'username': 'c', 'Exam 1': 25.0}])
+        self.assertEqual((page['count'], page['next_offset']), (3, 2))
+        page = utils.get_grades_page(data, index, 2, offset=2, sort='Exam 1', reverse=True)
+        self.assertEqual(page['data'], [{'username': 'a', 'Exam 1': 0}])
+        page = utils.get_grades_page(data, index, 10, search='B')
+        self.assertEqual(page['data'], [{'username': 'b', 'Exam 1': 75.5}])
+
+
+def get_data_tick(content, info, completed_blocks):
+    """
+        Completion percents of a student as computed before the block
+        membership matrices (reference implementation)
+    """
+    data = []
+    section_data = [0, 0]
+    total_units = [0, 0]
+    first = True
+    for subsection in content.values():
+        if subsection['type'] == 'subsection':
+            blocks_unit = []
+            for x in info[subsection['id']]['children']:
+                blocks_unit = blocks_unit + info[x]['children']
+            completed = 0
+            for xblock_id in blocks_unit:
+                if xblock_id in completed_blocks and 'discussion+block' not in xblock_id:
+                    completed += 1
+            data.append(utils.round_half_up((completed/len(blocks_unit))*100))
+            section_data[0] += completed
+            section_data[1] += len(blocks_unit)
+            total_units[0] += completed
+            total_units[1] += len(blocks_unit)
+        if not first and subsection['type'] == 'section' and subsection['num_children'] > 0:
+            data.append(utils.round_half_up((section_data[0]/section_data[1])*100))
+            section_data = [0, 0]
+        if first and subsection['type'] == 'section' and subsection['num_children'] > 0:
+            first = False
+    data.append(utils.round_half_up((section_data[0]/section_data[1])*100))
+    data.append(utils.round_half_up((total_units[0]/total_units[1])*100))
+    return data
+
+
+class TestCompletionMatrix(TestCase):
+
+    def get_random_course(self, rnd):
+        """
+            Random course tree, every unit has at least one block
+        """
+        id_course = 'block-v1:eol+Random+1+type@course+block@course'
+        info = {id_course: {'children': [], 'metadata': {'display_name': 'course'}}}
+        blocks = []
+        for inx in range(rnd.randint(1, 4)):
+            section = 'section-{}'.format(inx)
+            info[id_course]['children'].append(section)
+            info[section] = {'children': [], 'metadata': {'display_name': section}}
+            for jnx in range(rnd.choice([0, 1, 2, 3])):
+                subsection = '{}-subsection-{}'.format(section, jnx)
+                info[section]['children'].append(subsection)
+                info[subsection] = {'children': [], 'metadata': {'display_name': subsection}}
+                for knx in range(rnd.randint(1, 3)):
+                    unit = '{}-unit-{}'.format(subsection, knx)
+                    info[subsection]['children'].append(unit)
+                    info[unit] = {'children': [], 'metadata': {'display_name': unit}}
+                    for lnx in range(rnd.randint(1, 4)):
+                        block = '{}-{}+block-{}'.format(unit, rnd.choice(['problem', 'html', 'discussion']), lnx)
+                        info[unit]['children'].append(block)
+                        blocks.append(block)
+        if len(blocks) == 0:
+            return self.get_random_course(rnd)
+        return info, id_course, blocks
+
+    def test_same_percents_as_data_tick(self):
+        rnd = random.Random(10)
+        for _ in range(50):
+            info, id_course, blocks = self.get_random_course(rnd)
+            content, max_unit = utils.get_content(info, id_course)
+            block_index, membership = utils.get_completion_columns(content, info)
+            students = [set(x for x in blocks if rnd.random() < 0.5) for _ in range(rnd.randint(1, 6))]
+            matrix = np.zeros((len(students), membership.shape[0]), dtype=bool)
+            for row, completed_blocks in enumerate(students):
+                for block in completed_blocks:
+                    matrix[row, block_index.get(block, [])] = True
+            percents = utils.get_completion_percents(matrix, membership) / 100
+            expected = [get_data_tick(content, info, x) for x in students]
+            self.assertEqual(percents.tolist(), expected)
+            completion = [sum(x) for x in zip(*expected)]
+            self.assertEqual(
+                (utils.round_half_up_hundredths(np.cumsum(percents, axis=0)[-1] / len(students)) / 100).tolist(),
+                [utils.round_half_up(x/len(students)) for x in completion])
+
+
+class TestCourseBlocksInfo(ModuleStoreTestCase):
+
+    def setUp(self):
+        super(TestCourseBlocksInfo, self).setUp()
+        self.course = CourseFactory.create(org='eol', course='BlocksInfo', display_name='Blocks info')
+        self.blocks = []
+        for inx in range(2):
+            chapter = ItemFactory.create(parent_location=self.course.location, category='chapter', display_name='Chapter {}'.format(inx))
+            sequential = ItemFactory.create(parent_location=chapter.location, category='sequential', display_name='Sequential {}'.format(inx))
+            for jnx in range(2):
+                vertical = ItemFactory.create(parent_location=sequential.location, category='vertical', display_name='Vertical {}'.format(jnx))
+                for category in ['html', 'problem']:
+                    self.blocks.append(ItemFactory.create(parent_location=vertical.location, category=category, display_name=category).location)
+        ItemFactory.create(parent_location=self.course.location, category='chapter', display_name='Empty chapter')
+
+    def dump_course(self, module, destination):
+        """
+            Flat dict of the course read from the modulestore, like the
+            old dump_module
+        """
+        destination[str(module.location)] = {
+            'category': module.location.block_type,
+            'children': [str(child) for child in getattr(module, 'children', [])],
+            'metadata': {'display_name': module.display_name},
+        }
+        for child in module.get_children():
+            self.dump_course(child, destination)
+        return destination
+
+    def test_same_info_as_modulestore(self):
+        course = self.store.get_course(self.course.id, depth=None)
+        expected = self.dump_course(course, {})
+        info = utils.get_course_blocks_info(self.course.id)
+        self.assertEqual(info, expected)
+        id_course = str(self.course.location)
+        self.assertEqual(utils.get_content(info, id_course), utils.get_content(expected, id_course))
+        self.assertEqual(utils.get_content(info, id_course)[1], 4)
+
+    def test_completion_columns(self):
+        student = UserFactory(username='student')
+        for block_key in self.blocks[:2]:
+            BlockCompletion.objects.submit_completion(user=student, block_key=block_key, completion=1.0)
+        BlockCompletion.objects.submit_completion(user=student, block_key=self.blocks[4], completion=0.5)
+        info, content, max_unit = utils._get_completion_content(self.course.id)
+        block_index, membership = utils.get_completion_columns(content, info)
+        # Sequential 0, Chapter 0, Sequential 1, Chapter 1 and the course
+        self.assertEqual(membership.shape, (8, 5))
+        matrix = utils.get_completion_matrix([student.id], self.course.id, block_index, membership.shape[0])
+        self.assertEqual(matrix.sum(), 2)
+        percents = utils.get_completion_percents(matrix, membership) / 100
+        self.assertEqual(percents.tolist(), [[50.0, 50.0, 0.0, 0.0, 25.0]])
+
+
+class TestCompletionBitsets(TestCase):
+
+    @patch('eol_instructor.utils.get_completion_matrix')
+    def test_completion_log(self, get_completion_matrix):
+        course_key = CourseKey.from_string('course-v1:eol+Bitsets+1')
+        block_index = {'a': [0], 'b': [1, 2]}
+        get_completion_matrix.side_effect = lambda students_id, *args: np.array([[True, False, False]] * len(students_id))
+        log = utils.get_completion_log(course_key, 'v1')
+        self.assertEqual(utils.get_completion_log(course_key, 'v1'), log)
+        matrix = utils.get_completion_bitsets([1, 2], course_key, log, block_index, 3)
+        self.assertEqual(matrix.tolist(), [[True, False, False]] * 2)
+        utils.update_completion_bitset(course_key, 'b', 2, True)
+        utils.update_completion_bitset(course_key, 'a', 1, False)
+        utils.update_completion_bitset(course_key, 'b', 3, True)
+        matrix = utils.get_completion_bitsets([1, 2], course_key, log, block_index, 3)
+        self.assertEqual(matrix.tolist(), [[False, False, False], [True, True, True]])
+        self.assertEqual(get_completion_matrix.call_count, 1)
+        utils.cache.delete(utils._get_completion_bitset_key(course_key, log, 'delta-1'))
+        utils.get_completion_bitsets([1, 2], course_key, log, block_index, 3)
+        self.assertEqual(get_completion_matrix.call_count, 2)
+        self.assertNotEqual(utils.get_completion_log(course_key, 'v2'), log)
+
+
+class TestReportCodec(TestCase):
+
+    def test_grades_report(self):
+        data = {
+            'details': {
+                'headers': [
+                    {'name': 'username', 'data': 'username', 'visible': True},
+                    {'name': 'Exam 1', 'data': 'Exam 1', 'visible': True}
+                ],
+                'data': [
+                    {'Exam 1': 0, 'username': 'student'},
+                    {'Exam 1': 66.67, 'username': 'student2'},
+                    {'Exam 1': 0.0, 'username': 'student3'}
+                ]
+            },
+            'summary': {
+                'block-v1:eol+test+2021+type@sequential+block@exam': {
+                    'grades': [66.67, 0.0], 'avg': 33.34, 'grades_range': [1] + [0]*12 + [1] + [0]*7,
+                    'min': 0.0, 'max': 66.67, 'dev': 33.34, 'len': 2, 'rate': 66.67, 'format': 'Exam 1'
+                }
+            },
+            'time': '01/01/2021, 00:00:00',
+            'time_queue': '5.0'
+        }
+        encoded = report_codec.encode_grades_report(data)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(report_codec.decode_grades_report(encoded), data)
+        self.assertIs(type(report_codec.decode_report(encoded)['details']['data'][0]['Exam 1']), int)
+
+    def test_report_delta(self):
+        data = {'data': [['a@eol.cl', 'a', '', 50.0, 'No'], ['b@eol.cl', 'b', '', 0.0, 'No']], 'completion': [25.0, 0]}
+        new_data = {'data': [['a@eol.cl', 'a', '', 100.0, 'Si'], ['c@eol.cl', 'c', '', 0.0, 'No']], 'completion': [50.0, 1]}
+        row_hashes = report_codec.decode_row_hashes(report_codec.encode_row_hashes(report_codec.get_row_hashes(data)))
+        self.assertEqual(row_hashes, report_codec.get_row_hashes(data))
+        delta = report_codec.get_report_delta(new_data, report_codec.get_row_hashes(new_data), row_hashes)
+        self.assertEqual(delta, {'added': [new_data['data'][1]], 'changed': [new_data['data'][0]], 'removed': ['b']})
+        self.assertEqual(report_codec.get_report_delta(data, row_hashes, row_hashes), {'added': [], 'changed': [], 'removed': []})
+
+    def test_completion_report(self):
+        data = {
+            'data': [
+                ['student@eol.cl', 'student', '', 50.0, 33.33, 'Si'],
+                ['student2@eol.cl', 'student2', '', 0.0, 100.0, 'No']
+            ],
+            'completion': [25.0, 66.67, 1],
+            'time': '01/01/2021, 00:00:00'
+        }
+        encoded = report_codec.encode_completion_report(data)
+        self.assertEqual(report_codec.decode_completion_report(encoded), data)
+        data = {'data': [[True]], 'completion': [0]}
+        self.assertEqual(report_codec.decode_report(report_codec.encode_completion_report(data)), data)
+
+
+class TestReportStorage(TestCase):
+
+    @patch('eol_instructor.report_storage.CHUNK_SIZE', 64)
+    def test_set_get_report(self):
+        blob = bytes(range(256)) * 40
+        manifest = report_storage.set_report('eol_instructor-test-report', blob, 60)
+        self.assertEqual(manifest['size'], len(blob))
+        self.assertGreater(manifest['chunks'], 1)
+        self.assertEqual(report_storage.get_report('eol_instructor-test-report'), blob)
+        new_manifest = report_storage.set_report('eol_instructor-test-report', b'new report', 60)
+        self.assertNotEqual(new_manifest['version'], manifest['version'])
+        self.assertEqual(report_storage.get_report('eol_instructor-test-report'), b'new report')
+
+    @patch('eol_instructor.report_storage.CHUNK_SIZE', 64)
+    def test_expire_previous_chunks(self):
+        manifest = report_storage.set_report('eol_instructor-test-expire', bytes(range(256)), 600)
+        with patch('eol_instructor.report_storage.cache.touch') as touch:
+            report_storage.set_report('eol_instructor-test-expire', b'new report', 600)
+        touch.assert_has_calls([
+            call(report_storage._chunk_key('eol_instructor-test-expire', manifest['version'], inx), report_storage.CHUNK_GRACE_TIME)
+            for inx in range(manifest['chunks'])])
+
+    def test_get_missing_report(self):
+        self.assertIsNone(report_storage.get_report('eol_instructor-test-missing'))
+
+
+class TestStreamReport(TestCase):
+
+    def test_csv_formulas(self):
+        rows = [['=HYPERLINK("http://eol.cl")', 'student', -1.0, '@SUM(A1)'], ['+56912345678', '-', 0.5, 'a=b']]
+        response = views.stream_report(['Name', 'Username', 'Grade', 'Extra'], iter(rows), 'csv', 'test')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(content.splitlines(), [
+            'Name,Username,Grade,Extra',
+            '"\'=HYPERLINK(""http://eol.cl"")",student,-1.0,\'@SUM(A1)',
+            "'+56912345678,'-,0.5,a=b",
+        ])
+
+    def test_escape_csv_cell(self):
+        self.assertEqual(views.escape_csv_cell('\t=1+1'), "'\t=1+1")
+        self.assertEqual(views.escape_csv_cell('\r=1+1'), "'\r=1+1")
+        self.assertEqual(views.escape_csv_cell('student@eol.cl'), 'student@eol.cl')
+        self.assertEqual(views.escape_csv_cell(-1.0), -1.0)
+
+
+class TestReportRefresh(TestCase):
+
+    def test_stale_report(self):
+        task_process = Mock()
+        manifest = report_storage.set_report('eol_instructor-test-stale', b'report', 600)
+        with patch('eol_instructor.views.time.time', return_value=manifest['created'] + 30):
+            report = views.get_report_or_refresh(None, 'course', 'eol_instructor-test-stale', 60, task_process)
+        self.assertEqual(report, (b'report', 30))
+        task_process.assert_not_called()
+        with patch('eol_instructor.views.time.time', return_value=manifest['created'] + 90):
+            views.get_report_or_refresh(None, 'course', 'eol_instructor-test-stale', 60, task_process)
+            report = views.get_report_or_refresh(None, 'course', 'eol_instructor-test-stale', 60, task_process)
+        self.assertEqual(report, (b'report', 90))
+        task_process.assert_called_once_with(None, 'course')
+
+    def test_missing_report(self):
+        task_process = Mock()
+        report = views.get_report_or_refresh(None, 'course', 'eol_instructor-test-missing', 60, task_process)
+        self.assertEqual(report, (None, None))
+        task_process.assert_called_once_with(None, 'course')
+
+
+class TestPrewarmReports(TestCase):
+
+    @patch('eol_instructor.tasks.prewarm_report')
+    def test_prewarm_most_viewed(self, prewarm_report):
+        for course_id, hits in [('course-v1:eol+Prewarm+1', 5), ('course-v1:eol+Prewarm+2', 9), ('course-v1:eol+Prewarm+3', 1)]:
+            ReportAccess.objects.create(course_id=CourseKey.from_string(course_id), report='grades', hits=hits, last_access=now())
+        report_storage.set_report(tasks.get_grades_report_key('course-v1:eol+Prewarm+3'), b'report', 600)
+        with patch('eol_instructor.tasks.PREWARM_CONCURRENCY', 1):
+            self.assertEqual(tasks.prewarm_reports(), 1)
+            # The pre-warm of Prewarm+2 is still running
+            self.assertEqual(tasks.prewarm_reports(), 0)
+            report_storage.set_report(tasks.get_grades_report_key('course-v1:eol+Prewarm+2'), b'report', 600)
+            tasks.end_refresh(tasks.get_grades_report_key('course-v1:eol+Prewarm+2'))
+            self.assertEqual(tasks.prewarm_reports(), 1)
+        prewarm_report.delay.assert_has_calls([
+            call('grades', 'course-v1:eol+Prewarm+2'),
+            call('grades', 'course-v1:eol+Prewarm+1')])
+
+    def test_record_report_access(self):
+        course_key = CourseKey.from_string('course-v1:eol+Access+1')
+        utils.record_report_access(course_key, 'grades', 1)
+        utils.record_report_access(course_key, 'grades', 1)
+        self.assertEqual(ReportAccess.objects.get(course_id=course_key, report='grades').hits, 1)
+        ReportAccess.objects.filter(course_id=course_key).update(last_access=now() - timedelta(seconds=utils.REPORT_ACCESS_HALF_LIFE))
+        utils.record_report_access(course_key, 'grades', 2)
+        self.assertAlmostEqual(ReportAccess.objects.get(course_id=course_key, report='grades').hits, 1.5, places=3)
+
+
+class TestMergePartials(TestCase):
+
+    def test_merge_completion_partials(self):
+        rows = [['a@eol.cl', 'a', '', 0.33, 1.0, 'Si'], ['b@eol.cl', 'b', '', 0.67, 0.0, 'No'], ['c@eol.cl', 'c', '', 1.0, 0.5, 'No']]
+        data = utils.merge_completion_partials([{'rows': rows[:2], 'n_certificates': 1}, {'rows': rows[2:], 'n_certificates': 0}], 3)
+        self.assertEqual(data['data'], rows)
+        self.assertEqual(data['completion'], [0.67, 0.5, 1])
+        self.assertEqual(utils.merge_completion_partials([], 0), {'data': [[True]], 'completion': [0]})
+
+    @patch('eol_instructor.utils._get_enrolled_grades_users', return_value=([1, 2, 3], ['a', 'b', 'c']))
+    @patch('eol_instructor.utils.get_header_grades_sort')
+    @patch('eol_instructor.utils.get_grade_columns')
+    def test_merge_grades_partials(self, get_grade_columns, get_header_grades_sort, get_enrolled_grades_users):
+        course_key = CourseKey.from_string('course-v1:eol+Merge+1')
+        usage_keys = [course_key.make_usage_key('sequential', 'a'), course_key.make_usage_key('sequential', 'b')]
+        get_grade_columns.return_value = ([{'name': 'username', 'data': 'username', 'visible': True}], ['Homework 1', 'Exam 1'], usage_keys)
+        get_header_grades_sort.return_value = OrderedDict((str(x), 'Homework') for x in usage_keys)
+        partials = [
+            {'block_ids': [str(x) for x in usage_keys], 'user_ids': [1, 2], 'usernames': ['a', 'b'], 'grades': [[5000, -1], [5000, 10000]], 'counts': [[[5000, 2]], [[10000, 1]]]},
+            {'block_ids': [str(x) for x in usage_keys], 'user_ids': [3], 'usernames': ['c'], 'grades': [[-1, 2500]], 'counts': [[], [[2500, 1]]]},
+        ]
+        details = utils.merge_grades_partials(course_key, partials)
+        self.assertEqual([x['username'] for x in details['data']], ['a', 'b', 'c'])
+        self.assertEqual(details['data'][2], {'username': 'c', 'Homework 1': 0, 'Exam 1': 25.0})
+        aggregates = utils.get_grade_aggregates(course_key, [str(x) for x in usage_keys])
+        self.assertEqual(aggregates['students'], {1, 2, 3})
+        self.assertEqual(aggregates['subsections'][str(usage_keys[0])], {'values': {1: 5000, 2: 5000}, 'counts': {5000: 2}})
+        self.assertEqual(aggregates['subsections'][str(usage_keys[1])]['counts'], {10000: 1, 2500: 1})
+
+
+class TestGradeAggregates(TestCase):
+
+    @patch('eol_instructor.utils._get_enrolled_grades_users', return_value=([1, 2, 3], ['a', 'b', 'c']))
+    def test_update_grade_aggregate(self, get_enrolled_grades_users):
+        course_key = CourseKey.from_string('course-v1:eol+Aggregates+1')
+        usage_key = course_key.make_usage_key('sequential', 'a')
+        block_ids = [str(usage_key)]
+        version = utils.start_grade_aggregates(course_key)
+        utils.update_grade_aggregate(course_key, usage_key, 3, 25.0)
+        utils.set_grade_aggregates(course_key, version, block_ids, {1, 2}, {str(usage_key): {'values': {1: 5000, 2: 5000}, 'counts': {5000: 2}}})
+        utils.update_grade_aggregate(course_key, usage_key, 1, 100.0)
+        utils.update_grade_aggregate(course_key, usage_key, 2, None)
+        utils.update_grade_aggregate(course_key, usage_key, 4, 50.0)
+        aggregates = utils.get_grade_aggregates(course_key, block_ids)
+        self.assertEqual(aggregates['students'], {1, 2, 3})
+        self.assertEqual(aggregates['subsections'][str(usage_key)], {'values': {1: 10000, 3: 2500}, 'counts': {10000: 1, 2500: 1}})
+        # The applied grades are stored, only the new ones are read
+        utils.update_grade_aggregate(course_key, usage_key, 1, 25.0)
+        aggregates = utils.get_grade_aggregates(course_key, block_ids)
+        self.assertEqual(aggregates['subsections'][str(usage_key)], {'values': {1: 2500, 3: 2500}, 'counts': {2500: 2}})
+        # Enrolled and unenrolled students
+        get_enrolled_grades_users.return_value = ([1, 2, 4], ['a', 'b', 'd'])
+        aggregates = utils.get_grade_aggregates(course_key, block_ids)
+        self.assertEqual(aggregates['subsections'][str(usage_key)], {'values': {1: 2500, 4: 5000}, 'counts': {2500: 1, 5000: 1}})
+        utils.update_grade_aggregate(course_key, usage_key, 2, 50.0)
+        utils.cache.delete(utils._get_grade_aggregate_key(course_key, version, 'delta-6'))
+        self.assertIsNone(utils.get_grade_aggregates(course_key, block_ids))
+
+
+class TestStages(TestCase):
+
+    def test_get_stage(self):
+        compute = Mock(return_value={'students': [1, 2]})
+        self.assertEqual(stages.get_stage('test', 'course-v1:eol+Stage+1', ['v1'], compute), {'students': [1, 2]})
+        self.assertEqual(stages.get_stage('test', 'course-v1:eol+Stage+1', ['v1'], compute), {'students': [1, 2]})
+        self.assertEqual(compute.call_count, 1)
+        stages.get_stage('test', 'course-v1:eol+Stage+1', ['v2'], compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_get_generation(self):
+        generation = stages.get_generation('test', 'course-v1:eol+Stage+1')
+        self.assertEqual(stages.get_generation('test', 'course-v1:eol+Stage+1'), generation)
+        self.assertNotEqual(stages.get_generation('test', 'course-v1:eol+Stage+2'), generation)
+
+
+class TestActivityRollup(TestCase):
+
+    def setUp(self):
+        super(TestActivityRollup, self).setUp()
+        self.course_key = CourseKey.from_string('course-v1:eol+Activity+1')
+        CourseOverviewFactory.create(id=self.course_key)
+        self.students = [UserFactory(username='student{}'.format(x)) for x in range(2)]
+
+    def create_module(self, user, block_id, modified):
+        module = StudentModule.objects.create(
+            student=user,
+            course_id=self.course_key,
+            module_state_key=self.course_key.make_usage_key('problem', block_id),
+            module_type='problem')
+        StudentModule.objects.filter(id=module.id).update(modified=modified)
+
+    def test_rollup_and_backfill(self):
+        self.create_module(self.students[0], 'old', now() - timedelta(days=40))
+        self.create_module(self.students[1], 'old', now() - timedelta(days=10))
+        self.assertEqual(utils.rollup_learner_activity(), 0)
+        self.assertEqual(utils.get_activity_backfill_courses(), [self.course_key])
+        # The first rollup ran 5 days ago
+        ActivityRollupWatermark.objects.update(modified=now() - timedelta(days=5))
+        self.create_module(self.students[0], 'new', now() - timedelta(days=1))
+        self.assertEqual(utils.rollup_learner_activity(), 1)
+        watermark = ActivityRollupWatermark.objects.get(name=utils.ACTIVITY_ROLLUP_WATERMARK)
+        self.assertGreater(watermark.modified, now() - timedelta(days=1))
+        self.assertEqual(LearnerDailyActivity.objects.filter(course_id=self.course_key).count(), 2)
+        self.assertEqual(utils.rollup_learner_activity(), 0)
+        self.assertFalse(utils.backfill_learner_activity(self.course_key, 0))
+        self.assertTrue(utils.backfill_learner_activity(self.course_key, 60))
+        self.assertEqual(utils.get_activity_backfill_courses(), [])
+        self.assertTrue(utils.is_activity_rollup_complete(self.course_key))
+        daily = utils.get_daily_activity(self.course_key, (now() - timedelta(days=60)).date())
+        self.assertEqual([x['active_learners'] for x in daily], [1, 1, 1])
+        self.assertEqual(
+            [x['date'] for x in daily],
+            [(now() - timedelta(days=x)).date() for x in [40, 10, 1]])
+        self.assertEqual(utils.get_daily_activity(self.course_key, (now() - timedelta(days=60)).date(), 'problem'), daily)
+
+
+class TestProgress(TestCase):
+
+    def test_shards_progress(self):
+        key = 'eol_instructor-test-progress'
+        task_progress = Mock()
+        tasks.start_shards(key, 3, task_progress)
+        self.assertEqual(task_progress.total, 3)
+        task_progress.update_task_state.assert_called_once_with(extra_meta={'step': 'shards'})
+        tasks.set_shard_done(key, 3)
+        tasks.set_shard_done(key, 3)
+        progress = tasks.get_progress(key)
+        self.assertEqual((progress['step'], progress['done'], progress['total']), ('shards', 2, 3))
+
+    @patch('eol_instructor.tasks.LIMIT_STUDENTS', 10000)
+    def test_get_shards(self):
+        items = list(range(10001))
+        shards = tasks.get_shards(items)
+        self.assertEqual([len(x) for x in shards], [5000, 5001])
+        self.assertEqual(sum(shards, []), items)
+        self.assertEqual([len(x) for x in tasks.get_shards(list(range(30000)))], [10000, 10000, 10000])
+
+    def test_is_running(self):
+        key = 'eol_instructor-test-running'
+        self.assertFalse(tasks.is_running(key))
+        tasks.set_progress(key, 'grades', 0, 10)
+        self.assertTrue(tasks.is_running(key))
+        later = tasks.time() + tasks.RUNNING_TIMEOUT + 1
+        with patch('eol_instructor.tasks.time', return_value=later):
+            self.assertFalse(tasks.is_running(key))
+            tasks.set_heartbeat(key)
+            self.assertTrue(tasks.is_running(key))
+        tasks.set_progress(key, 'done', 10, 10)
+        self.assertFalse(tasks.is_running(key))
+
+    def test_fail_report_shards(self):
+        key = tasks.get_grades_report_key('course-v1:eol+Fail+1')
+        tasks.start_shards(key, 2)
+        tasks.fail_report_shards('merge-task-id', report='grades', course_id='course-v1:eol+Fail+1')
+        self.assertIsNone(utils.cache.get(key + "-refresh"))
+        self.assertEqual(tasks.get_progress(key)['step'], 'failed')
+
+    @patch('eol_instructor.tasks.get_all_persistant_grades', side_effect=ValueError('error'))
+    @patch('eol_instructor.tasks.get_course_grade_summary', return_value={})
+    @patch('eol_instructor.tasks._get_enrolled_grades_users', return_value=([1], ['a']))
+    def test_generate_grades_report_failed(self, get_enrolled_grades_users, get_course_grade_summary, get_all_persistant_grades):
+        course_key = CourseKey.from_string('course-v1:eol+Fail+2')
+        key = tasks.get_grades_report_key(course_key)
+        utils.cache.set(key + "-refresh", True)
+        with self.assertRaises(ValueError):
+            tasks.generate_grades_report(course_key)
+        self.assertIsNone(report_storage.get_report_manifest(key + "-partial"))
+        self.assertIsNone(utils.cache.get(key + "-refresh"))
+        self.assertEqual(tasks.get_progress(key)['step'], 'failed')
+
+    def test_fail_lost_report(self):
+        course_key = CourseKey.from_string('course-v1:eol+Lost+1')
+        key = tasks.get_completion_report_key(course_key)
+        entry = InstructorTask.create(course_key, tasks.COMPLETION_TASK_TYPE, str(course_key), {}, UserFactory())
+        InstructorTask.objects.filter(pk=entry.pk).update(task_state='PROGRESS', updated=now() - timedelta(seconds=tasks.LOST_TIMEOUT + 1))
+        tasks.start_shards(key, 2)
+        self.assertFalse(tasks.fail_lost_report('completion', course_key))
+        later = tasks.time() + tasks.LOST_TIMEOUT + 1
+        with patch('eol_instructor.tasks.time', return_value=later):
+            self.assertTrue(tasks.fail_lost_report('completion', course_key))
+        self.assertEqual(InstructorTask.objects.get(pk=entry.pk).task_state, 'FAILURE')
+        self.assertIsNone(utils.cache.get(key + "-refresh"))
+        self.assertEqual(tasks.get_progress(key)['step'], 'failed')
+        self.assertFalse(tasks.fail_lost_report('completion', course_key))
+
+
+class TestUsersInfo(ModuleStoreTestCase):
+
+    def setUp(self):
+        super(TestUsersInfo, self).setUp()
+        self.course = CourseFactory.create(org='eol', course='UsersInfo', display_name='Users info')
+        self.student = UserFactory(username='student')
+        CourseEnrollmentFactory(user=self.student, course_id=self.course.id)
+        UserFactory(username='unenrolled')
+
+    @patch('eol_instructor.utils.get_learner_grades')
+    def test_get_users_info(self, get_learner_grades):
+        get_learner_grades.side_effect = lambda course_key, users: {x.id: {'passed': False, 'grades': []} for x in users}
+        users_info = utils.get_users_info(['student', 'unenrolled', 'unknown'], self.course.id)
+        self.assertEqual(list(users_info.keys()), ['student'])
+        self.assertEqual(users_info['student']['email'], self.student.email)
+        self.assertEqual(users_info['student']['enroll_mode'], 'audit')
+        self.assertFalse(users_info['student']['cert'])
+        self.assertFalse(users_info['student']['passed'])
+
+    @patch('eol_instructor.utils.get_learner_grades', return_value={})
+    def test_get_user_info_grade_error(self, get_learner_grades):
+        info = utils.get_user_info('student', self.course.id)
+        self.assertEqual((info['passed'], info['grades']), (False, []))
+        self.assertEqual(utils.user_grade_summary(self.student, self.course.id), [])
+
+    @patch('eol_instructor.utils.get_learner_grades', return_value={})
+    @patch('eol_instructor.views.check_report_access')
+    def test_max_users_info(self, check_report_access, get_learner_grades):
+        usernames = ['user{}'.format(x) for x in range(views.MAX_USERS_INFO + 1)]
+        response = views.get_users_info_api(RequestFactory().get('/', {'username': usernames}), str(self.course.id))
+        self.assertEqual(response.status_code, 400)
+        response = views.get_users_info_api(RequestFactory().get('/', {'username': usernames[1:]}), str(self.course.id))
+        self.assertEqual(response.status_code, 200)
+
+
+class TestEnrolledStudents(ModuleStoreTestCase):
+
+    def setUp(self):
+        super(TestEnrolledStudents, self).setUp()
+        self.course = CourseFactory.create(org='eol', course='Enrolled', display_name='Enrolled students')
+        self.students = [UserFactory(username='student{}'.format(x)) for x in range(2)]
+        CourseEnrollmentFactory(user=self.students[0], course_id=self.course.id, mode='audit')
+        CourseEnrollmentFactory(user=self.students[1], course_id=self.course.id, mode='honor')
+        self.staff = UserFactory(username='staff')
+        CourseEnrollmentFactory(user=self.staff, course_id=self.course.id)
+        CourseStaffRole(self.course.id).add_users(self.staff)
+        self.unenrolled = UserFactory(username='unenrolled')
+        CourseEnrollmentFactory(user=self.unenrolled, course_id=self.course.id, is_active=False)
+
+    def create_course_grade(self, user, letter_grade):
+        PersistentCourseGrade.objects.create(
+            user_id=user.id,
+            course_id=self.course.id,
+            percent_grade=0.8 if letter_grade else 0.2,
+            letter_grade=letter_grade,
+            grading_policy_hash='')
+
+    @patch('eol_instructor.utils.should_persist_grades', return_value=True)
+    def test_get_course_metrics(self, should_persist_grades):
+        self.create_course_grade(self.students[0], 'Pass')
+        for user in self.students + [self.staff]:
+            StudentModule.objects.create(
+                student=user,
+                course_id=self.course.id,
+                module_state_key=self.course.id.make_usage_key('problem', 'problem'),
+                module_type='problem')
+        StudentModule.objects.filter(student=self.students[0]).update(modified=now() - timedelta(days=60))
+        metrics = utils.get_course_metrics(self.course.id)
+        self.assertEqual(metrics, {
+            'n_team': 1,
+            'n_student': 2,
+            'n_student_modes': {'audit': 1, 'honor': 1},
+            'n_passed': 1,
+            'activity_started': 2,
+            'activity_last_week': 1
+        })
+        self.assertEqual(utils.get_course_metrics(self.course.id), metrics)
+        CourseEnrollmentFactory(user=UserFactory(username='new'), course_id=self.course.id, mode='audit')
+        metrics = utils.get_course_metrics(self.course.id)
+        self.assertEqual((metrics['n_student'], metrics['n_student_modes']['audit']), (3, 2))
+
+    @patch('eol_instructor.utils.should_persist_grades', return_value=True)
+    def test_get_courses_grades(self, should_persist_grades):
+        self.create_course_grade(self.students[0], 'Pass')
+        self.create_course_grade(self.students[1], '')
+        self.create_course_grade(self.staff, 'Pass')
+        self.create_course_grade(self.unenrolled, 'A')
+        enrolled_users = utils.get_enrolled_students(self.course.id)
+        self.assertEqual(set(enrolled_users.values_list('user_id', flat=True)), set(x.id for x in self.students))
+        self.assertEqual(utils.get_courses_grades(self.course.id, enrolled_users), 1)
+        grades = PersistentCourseGrade.objects.filter(course_id=self.course.id)
+        students_id = [x.id for x in self.students]
+        expected = set(students_id)
+        self.assertEqual(set(utils.filter_enrolled_users(grades, self.course.id).values_list('user_id', flat=True)), expected)
+        self.assertEqual(set(utils.filter_enrolled_users(grades, self.course.id, students_id).values_list('user_id', flat=True)), expected)
+        with patch('eol_instructor.utils.MAX_USER_IDS_PARAMS', 1):
+            self.assertEqual(set(utils.filter_enrolled_users(grades, self.course.id, students_id).values_list('user_id', flat=True)), expected)
+        self.assertEqual(
+            set(utils.filter_enrolled_users(grades, self.course.id, include_staff=True).values_list('user_id', flat=True)),
+            expected | {self.staff.id})
+
+
+class TestLearnerGrades(TestCase):
+
+    @patch('eol_instructor.utils.get_course_version', return_value='v1')
+    @patch('eol_instructor.utils.get_grade_summary', return_value=[])
+    @patch('eol_instructor.utils.get_course_by_id')
+    @patch('eol_instructor.utils.CourseGradeFactory')
+    @patch('eol_instructor.utils.should_persist_grades', return_value=True)
+    def test_get_learner_grades(self, should_persist_grades, grade_factory, get_course_by_id, get_grade_summary, get_course_version):
+        course_key = CourseKey.from_string('course-v1:eol+Learner+1')
+        users = [Mock(id=1, username='a'), Mock(id=2, username='b')]
+        grades_iter = grade_factory.return_value.iter
+        grades_iter.side_effect = lambda missing, course: [(x, Mock(passed=True), None if x.id == 1 else Exception('error')) for x in missing]
+        self.assertEqual(utils.get_learner_grades(course_key, users), {1: {'passed': True, 'grades': []}})
+        self.assertEqual(utils.get_learner_grades(course_key, users), {1: {'passed': True, 'grades': []}})
+        self.assertEqual(grades_iter.call_args[0][0], [users[1]])
+        should_persist_grades.return_value = False
+        utils.get_learner_grades(course_key, users)
+        self.assertEqual(grades_iter.call_args[0][0], users)
+
+    @patch('eol_instructor.utils.get_course_version', return_value='v1')
+    def test_learner_grade_keys(self, get_course_version):
+        course_key = CourseKey.from_string('course-v1:eol+Learner+2')
+        keys = utils._get_learner_grade_keys(course_key, [1, 2])
+        self.assertNotEqual(keys[1], keys[2])
+        PersistentCourseGrade.objects.create(user_id=1, course_id=course_key, percent_grade=0.5, letter_grade='Pass', grading_policy_hash='')
+        new_keys = utils._get_learner_grade_keys(course_key, [1, 2])
+        self.assertNotEqual(new_keys[1], keys[1])
+        self.assertEqual(new_keys[2], keys[2])
+
+    @patch('eol_instructor.utils.PersistentSubsectionGradeOverride')
+    def test_grade_summary_override_history(self, override_model):
+        def section(display_name, override_id):
+            return Mock(
+                graded_total=Mock(earned=0, possible=2),
+                percent_graded=0,
+                display_name=display_name,
+                format='Exam',
+                due=None,
+                override=Mock(id=override_id),
+                problem_scores={})
+        course_grade = Mock(chapter_grades=OrderedDict([
+            ('c1', {'display_name': 'Chapter 1', 'sections': [section('Exam 1', 7)]}),
+            ('c2', {'display_name': 'Chapter 2', 'sections': [section('Exam 2', 9)]}),
+        ]))
+        override_model.history.filter.return_value.order_by.return_value = [Mock(id=7, system='GRADEBOOK')]
+        summary = utils.get_grade_summary(course_grade, Mock(self_paced=False))
+        override_model.history.filter.assert_called_once_with(id__in=[7, 9])
+        self.assertEqual(summary[0]['children'][0]['override'], 'Section grade has been overridden.')
+        self.assertEqual(summary[1]['children'][0]['override'], 'Suspicious activity detected during proctored exam review. Exam score 0.')
+
+
+class TestReportResponse(TestCase):
+
+    def test_conditional_response(self):
+        key = 'eol_instructor-test-response'
+        data = {'data': [['a@eol.cl', 'a', '', 50.0, 'No']], 'completion': [50.0, 0]}
+        blob = report_codec.encode_completion_report(data)
+        manifest = report_storage.set_report(key, blob, 600)
+        tasks.store_report_body(key, manifest, blob, 600)
+        task_process = Mock()
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        response = views.get_report_response(request, 'course', key, 300, task_process)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], '"{}"'.format(manifest['version']))
+        body = json.loads(gzip.decompress(response.content).decode('utf-8'))
+        self.assertEqual(body['data'], data['data'])
+        self.assertEqual(body['created'], manifest['created'])
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        response = views.get_report_response(request, 'course', key, 300, task_process)
+        self.assertEqual(response.status_code, 304)
+        task_process.assert_not_called()
+
+    @patch('eol_instructor.views.check_report_access')
+    def test_delta_since_etag(self, check_report_access):
+        course_id = 'course-v1:eol+Delta+1'
+        course_key = CourseKey.from_string(course_id)
+        view = views.EolCompletionInstructor.as_view()
+        tasks.store_completion_report(course_key, {'data': [['a@eol.cl', 'a', '', 50.0, 'No']], 'completion': [50.0, 0]})
+        request = RequestFactory().get('/')
+        request.user = Mock(id=1)
+        etag = view(request, course_id=course_id)['ETag']
+        manifest = tasks.store_completion_report(course_key, {'data': [['a@eol.cl', 'a', '', 100.0, 'No']], 'completion': [100.0, 0]})
+        for since in [etag, 'W/' + etag, etag.strip('"')]:
+            request = RequestFactory().get('/', {'since': since})
+            request.user = Mock(id=1)
+            response = view(request, course_id=course_id)
+            self.assertEqual(response.status_code, 200)
+            body = json.loads(response.content.decode('utf-8'))
+            self.assertEqual(body['since'], etag.strip('"'))
+            self.assertEqual(body['report_version'], manifest['version'])
+            self.assertIn('delta', body)
@@ -19,6 +19,13 @@ urlpatterns = [
         get_user_info_api,
         name='get_user_info_api',
     ),
+    url(
+        r'eol_instructor/users_info/{}$'.format(
+            settings.COURSE_ID_PATTERN,
+        ),
+        get_users_info_api,
+        name='get_users_info_api',
+    ),
     url(
         r'eol_instructor/completion_data/{}$'.format(
             settings.COURSE_ID_PATTERN,
@@ -26,4 +33,34 @@ urlpatterns = [
         EolCompletionInstructor.as_view(),
         name='get_completion_data',
     ),
+    url(
+        r'eol_instructor/grades_export/{}$'.format(
+            settings.COURSE_ID_PATTERN,
+        ),
+        EolGradesExport.as_view(),
+        name='export_grades',
+    ),
+    url(
+        r'eol_instructor/completion_export/{}$'.format(
+            settings.COURSE_ID_PATTERN,
+        ),
+        EolCompletionExport.as_view(),
+        name='export_completion',
+    ),
+    url(
+        r'eol_instructor/grades_status/{}$'.format(
+            settings.COURSE_ID_PATTERN,
+        ),
+        EolReportStatus.as_view(),
+        {'report': 'grades'},
+        name='grades_status',
+    ),
+    url(
+        r'eol_instructor/completion_status/{}$'.format(
+            settings.COURSE_ID_PATTERN,
+        ),
+        EolReportStatus.as_view(),
+        {'report': 'completion'},
+        name='completion_status',
+    ),
 ]
@@ -1,63 +1,352 @@
 import json
 import logging
+import math
+import pickle
+import time
+import zlib
+import numpy as np
 import requests
-import six 
+import sys
 from collections import OrderedDict, defaultdict, deque
-from common.djangoapps.student.models import CourseEnrollment
+from common.djangoapps.student.models import CourseAccessRole, CourseEnrollment
 from completion.models import BlockCompletion
 from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
 from django.conf import settings
+from django.core.cache import cache
+from datetime import timedelta
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
 from django.utils.timezone import now
-from django.utils.translation import ugettext as _
+from django.utils.translation import get_language, ugettext as _
 from lms.djangoapps.certificates.models import GeneratedCertificate
 from lms.djangoapps.courseware.courses import get_course_by_id
 from lms.djangoapps.courseware.models import StudentModule
 from lms.djangoapps.grades.api import constants as grades_constants
 from lms.djangoapps.grades.config import assume_zero_if_absent, should_persist_grades
 from lms.djangoapps.grades.course_grade_factory import CourseGradeFactory
-from lms.djangoapps.grades.models import PersistentCourseGrade, PersistentSubsectionGrade
+from lms.djangoapps.grades.models import PersistentCourseGrade, PersistentSubsectionGrade, PersistentSubsectionGradeOverride
+from lms.djangoapps.grades.transformer import GradesTransformer
 from opaque_keys.edx.keys import CourseKey, UsageKey, LearningContextKey
+from openedx.core.djangoapps.content.block_structure.api import get_block_structure_manager
+from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from openedx.core.djangoapps.course_groups.models import CohortMembership, CourseUserGroup
 from openedx.core.djangoapps.course_groups import cohorts
 from opaque_keys.edx.locator import CourseLocator, BlockUsageLocator
 from operator import add
-from statistics import mean, pstdev
 from lms.djangoapps.certificates import api as certs_api
-from xblock.fields import Scope
-from xblock_discussion import DiscussionXBlock
+from . import stages
+from .report_storage import get_report, set_report
+from .models import ALL_BLOCK_TYPES, ActivityRollupWatermark, CourseDailyActivity, LearnerDailyActivity, ReportAccess
 from xmodule.modulestore.django import modulestore
-from xmodule.modulestore.inheritance import compute_inherited_metadata, own_metadata
+from uuid import uuid4
 
 
 logger = logging.getLogger(__name__)
-FILTER_LIST = ['xml_attributes']
-INHERITED_FILTER_LIST = ['children', 'xml_attributes']
+GRADE_MATRIX_CHUNK_SIZE = 2000
+EXPORT_CHUNK_SIZE = 500
+NOT_ATTEMPTED = -1
+MAX_USER_IDS_PARAMS = 1000
+GRADE_AGGREGATES_KEY = "eol_grades_aggregates-{}"
+# Summaries with more grades saved since the last rebuild are rebuilt
+MAX_GRADE_DELTAS = 20000
+GRADES_RECONCILE_TIME = 3600
+STRUCTURE_KEY = "eol_instructor_structure-{}-{}-{}"
+STRUCTURE_CACHE_TIME = 86400
+COURSE_VERSION_KEY = "eol_instructor_version-{}"
+COMPLETION_BITSETS_KEY = "eol_completion_bits-{}"
+COURSE_METRICS_KEY = "eol_instructor_metrics-{}"
+COURSE_METRICS_TIME = 300
+# Published courses have a new overview, global config changes are seen
+# after the timeout
+COURSE_SETTINGS_KEY = "eol_instructor_settings-{}"
+COURSE_SETTINGS_TIME = 3600
+LEARNER_GRADE_KEY = "eol_instructor_learner_grade-{}-{}-{}-{}-{}-{}"
+LEARNER_GRADE_TIME = 86400
+# Stages and generations of the report pipeline (see stages.py)
+ENROLLMENT_STAGE_TIME = 3600
+ENROLLMENT_GENERATION = 'enrollment'
+CERTIFICATES_GENERATION = 'certificates'
+GRADES_GENERATION = 'grades'
+COMPLETION_GENERATION = 'completion'
+ACTIVITY_ROLLUP_WATERMARK = 'student_module'
+# Time of the first rollup, the history before it is added by course
+ACTIVITY_ROLLUP_START = 'student_module-start'
+ACTIVITY_ROLLUP_COURSE = 'student_module-course-{}'
+# Days of StudentModule read by each query of the rollup
+ACTIVITY_ROLLUP_WINDOW = 30
+ACTIVITY_ROLLUP_KEY = "eol_instructor_activity_rollup-{}"
+ACTIVITY_ROLLUP_KEY_TIME = 86400
+ACTIVITY_ROLLUP_BATCH_SIZE = 5000
+# Modules saved in the last seconds may belong to open transactions
+ACTIVITY_ROLLUP_LAG = 60
+REPORT_ACCESS_KEY = "eol_instructor_access-{}-{}-{}"
+# Each user counts one view of a report per REPORT_ACCESS_WINDOW seconds,
+# the views count half after REPORT_ACCESS_HALF_LIFE seconds
+REPORT_ACCESS_WINDOW = 3600
+REPORT_ACCESS_HALF_LIFE = 86400
+COMPLETION_BITSET_TIME = 3600
+# Bitsets with more completions logged since they were built are rebuilt
+MAX_COMPLETION_DELTAS = 20000
+
+if hasattr(settings, 'EOL_INSTRUCTOR_GRADES_RECONCILE_TIME'):
+    GRADES_RECONCILE_TIME = settings.EOL_INSTRUCTOR_GRADES_RECONCILE_TIME
+
+if hasattr(settings, 'EOL_INSTRUCTOR_COMPLETION_BITSET_TIME'):
+    COMPLETION_BITSET_TIME = settings.EOL_INSTRUCTOR_COMPLETION_BITSET_TIME
+
+def get_enrolled_students(course_key, include_staff=False):
+    """
+        Active enrollments of the course, without the course staff
+    """
+    enrollments = CourseEnrollment.objects.filter(is_active=1, course_id=course_key)
+    if not include_staff:
+        enrollments = enrollments.exclude(user__courseaccessrole__course_id=course_key)
+    return enrollments
+
+def filter_enrolled_users(queryset, course_key, user_ids=None, field='user_id', include_staff=False):
+    """
+        Filter the queryset to the enrolled students, with user_ids when it
+        is a short list and with an enrollment subquery otherwise
+    """
+    if user_ids is not None and len(user_ids) <= MAX_USER_IDS_PARAMS:
+        return queryset.filter(**{field + '__in': user_ids})
+    return queryset.filter(**{field + '__in': get_enrolled_students(course_key, include_staff).values('user_id')})
 
 def get_courses_grades(course_key, enrolled_users):
     """
         Get persistent grades
     """
-    user_ids = [x['user__id'] for x in enrolled_users.values('user__id')]
     if should_persist_grades(course_key):
-        return PersistentCourseGrade.objects.filter(course_id=course_key, user_id__in=user_ids, letter_grade__in=['A','Pass']).count()
+        return PersistentCourseGrade.objects.filter(course_id=course_key, user_id__in=enrolled_users.values('user_id'), letter_grade__in=['A','Pass']).count()
     return 0
 
 def get_students_activity(course_key, enrolled_users):
     """
         Get how many student did something in the course
     """
-    user_ids = [x['user__id'] for x in enrolled_users.values('user__id')]
-    return StudentModule.objects.filter(course_id=course_key, student_id__in=user_ids).values('student_id').distinct().count()
+    return get_activity_counts(course_key, enrolled_users)['started']
 
 def get_students_activity_last_week(course_key, enrolled_users):
     """
         Get how many student did something in the current week
     """
-    user_ids = [x['user__id'] for x in enrolled_users.values('user__id')]
-    from datetime import date
-    current_week = date.today().isocalendar()[1]
-    return StudentModule.objects.filter(course_id=course_key, student_id__in=user_ids, modified__week=current_week).values('student_id').distinct().count()
+    return get_activity_counts(course_key, enrolled_users)['last_week']
+
+def get_activity_counts(course_key, enrolled_users):
+    """
+        Return how many students did something in the course ('started')
+        and in the current ISO week ('last_week'), from the daily activity
+        rollup or from StudentModule until the history of the course is in
+        the rollup
+    """
+    today = now().date()
+    week_start = today - timedelta(days=today.weekday())
+    if is_activity_rollup_complete(course_key):
+        return LearnerDailyActivity.objects.filter(
+            course_id=course_key,
+            block_type=ALL_BLOCK_TYPES,
+            user_id__in=enrolled_users.values('user_id')).aggregate(
+            started=Count('user_id', distinct=True),
+            last_week=Count('user_id', distinct=True, filter=Q(date__gte=week_start)))
+    return StudentModule.objects.filter(
+        course_id=course_key,
+        student_id__in=enrolled_users.values('user_id')).aggregate(
+        started=Count('student_id', distinct=True),
+        last_week=Count('student_id', distinct=True, filter=Q(modified__date__gte=week_start)))
+
+def is_activity_rollup_complete(course_key):
+    """
+        Check if the whole history of the course is in the daily activity
+        rollup, cached (a complete course stays complete)
+    """
+    cache_key = ACTIVITY_ROLLUP_KEY.format(course_key)
+    complete = cache.get(cache_key)
+    if complete is None:
+        start = ActivityRollupWatermark.objects.filter(name=ACTIVITY_ROLLUP_START).first()
+        complete = start is not None and ActivityRollupWatermark.objects.filter(
+            name=ACTIVITY_ROLLUP_COURSE.format(course_key),
+            modified__gte=start.modified).exists()
+        cache.set(cache_key, complete, ACTIVITY_ROLLUP_KEY_TIME if complete else COURSE_METRICS_TIME)
+    return complete
+
+def get_daily_activity(course_key, start_date, block_type=ALL_BLOCK_TYPES):
+    """
+        Return the distinct active learners of each day since start_date
+    """
+    return list(CourseDailyActivity.objects.filter(
+        course_id=course_key,
+        block_type=block_type,
+        date__gte=start_date).order_by('date').values('date', 'active_learners'))
+
+def _rollup_modules(modules):
+    """
+        Add the learners of the StudentModule queryset to the daily activity
+        tables, return the number of (course, day) updated
+    """
+    modules = modules.annotate(date=TruncDate('modified')).values_list('course_id', 'student_id', 'module_type', 'date').distinct()
+    touched = set()
+    activities = []
+    for course_id, student_id, module_type, date in modules.iterator(chunk_size=ACTIVITY_ROLLUP_BATCH_SIZE):
+        touched.add((course_id, date))
+        activities.append(LearnerDailyActivity(course_id=course_id, date=date, block_type=ALL_BLOCK_TYPES, user_id=student_id))
+        activities.append(LearnerDailyActivity(course_id=course_id, date=date, block_type=module_type, user_id=student_id))
+        if len(activities) >= ACTIVITY_ROLLUP_BATCH_SIZE:
+            LearnerDailyActivity.objects.bulk_create(activities, ignore_conflicts=True)
+            activities = []
+    LearnerDailyActivity.objects.bulk_create(activities, ignore_conflicts=True)
+    for course_id, date in touched:
+        counts = LearnerDailyActivity.objects.filter(course_id=course_id, date=date).values('block_type').annotate(count=Count('user_id')).order_by()
+        for x in counts:
+            CourseDailyActivity.objects.update_or_create(
+                course_id=course_id,
+                date=date,
+                block_type=x['block_type'],
+                defaults={'active_learners': x['count']})
+    return len(touched)
+
+def rollup_learner_activity():
+    """
+        Add the StudentModule modified since the last rollup to the daily
+        activity tables, at most ACTIVITY_ROLLUP_WINDOW days per run. The
+        first rollup only starts the watermark, the history before it is
+        added by course (backfill_learner_activity).
+        Return the number of (course, day) updated.
+    """
+    watermark = ActivityRollupWatermark.objects.filter(name=ACTIVITY_ROLLUP_WATERMARK).first()
+    end = now() - timedelta(seconds=ACTIVITY_ROLLUP_LAG)
+    if watermark is None:
+        ActivityRollupWatermark.objects.create(name=ACTIVITY_ROLLUP_START, modified=end)
+        ActivityRollupWatermark.objects.create(name=ACTIVITY_ROLLUP_WATERMARK, modified=end)
+        return 0
+    end = min(end, watermark.modified + timedelta(days=ACTIVITY_ROLLUP_WINDOW))
+    n_days = _rollup_modules(StudentModule.objects.filter(modified__gt=watermark.modified, modified__lte=end))
+    watermark.modified = end
+    watermark.save()
+    return n_days
+
+def get_activity_backfill_courses():
+    """
+        Return the courses whose history is not in the daily activity rollup
+        yet, the most recent first
+    """
+    start = ActivityRollupWatermark.objects.filter(name=ACTIVITY_ROLLUP_START).first()
+    if start is None:
+        return []
+    complete = set(ActivityRollupWatermark.objects.filter(
+        name__startswith=ACTIVITY_ROLLUP_COURSE.format(''),
+        modified__gte=start.modified).values_list('name', flat=True))
+    courses = CourseOverview.objects.order_by('-start').values_list('id', flat=True)
+    return [x for x in courses if ACTIVITY_ROLLUP_COURSE.format(x) not in complete]
+
+def backfill_learner_activity(course_key, time_budget):
+    """
+        Add the history of the course (the StudentModule modified before the
+        first rollup) to the daily activity tables, ACTIVITY_ROLLUP_WINDOW
+        days at a time while there are time_budget seconds left.
+        Return whether the history of the course is complete.
+    """
+    start = ActivityRollupWatermark.objects.get(name=ACTIVITY_ROLLUP_START).modified
+    name = ACTIVITY_ROLLUP_COURSE.format(course_key)
+    watermark = ActivityRollupWatermark.objects.filter(name=name).first()
+    if watermark is None:
+        first = StudentModule.objects.filter(course_id=course_key, modified__lte=start).aggregate(first=Min('modified'))['first']
+        watermark = ActivityRollupWatermark.objects.create(
+            name=name,
+            modified=first - timedelta(seconds=1) if first is not None else start)
+    deadline = time.time() + time_budget
+    while watermark.modified < start and time.time() < deadline:
+        end = min(watermark.modified + timedelta(days=ACTIVITY_ROLLUP_WINDOW), start)
+        _rollup_modules(StudentModule.objects.filter(course_id=course_key, modified__gt=watermark.modified, modified__lte=end))
+        watermark.modified = end
+        watermark.save()
+    return watermark.modified >= start
+
+def get_course_metrics(course_key):
+    """
+        Return the course overview metrics (enrollment by mode, students,
+        team, passed and active students) in a fixed number of grouped
+        queries. Cached by course and deleted when enrollments or course
+        roles change.
+    """
+    cache_key = COURSE_METRICS_KEY.format(course_key)
+    metrics = cache.get(cache_key)
+    if metrics is not None:
+        return metrics
+    enrolled_users = get_enrolled_students(course_key)
+    modes = {x['mode']: x['count'] for x in enrolled_users.values('mode').annotate(count=Count('id')).order_by()}
+    activity = get_activity_counts(course_key, enrolled_users)
+    metrics = {
+        'n_team': CourseAccessRole.objects.filter(course_id=course_key).values('user').distinct().count(),
+        'n_student': sum(modes.values()),
+        'n_student_modes': modes,
+        'n_passed': get_courses_grades(course_key, enrolled_users),
+        'activity_started': activity['started'],
+        'activity_last_week': activity['last_week']
+    }
+    cache.set(cache_key, metrics, COURSE_METRICS_TIME)
+    return metrics
+
+def clear_course_metrics(course_key):
+    cache.delete(COURSE_METRICS_KEY.format(course_key))
+    stages.bump_generation(ENROLLMENT_GENERATION, course_key)
+
+def get_course_settings(course_key):
+    """
+        Return the course settings snapshot: overview info, grading policy,
+        graded subsections by type, advanced modules, cohorts and
+        certificates config. Cached until the course is published again
+        (the overview is updated) or the cohort/cert config changes.
+    """
+    from cms.djangoapps.models.settings.course_grading import CourseGradingModel
+    overview = CourseOverview.get_from_id(course_key)
+    cache_key = COURSE_SETTINGS_KEY.format(course_key)
+    snapshot = cache.get(cache_key)
+    if snapshot is not None and snapshot['modified'] == overview.modified:
+        return snapshot
+    with modulestore().bulk_operations(course_key):
+        graded_subsections = get_graded_subsections_by_format(course_key)
+        snapshot = {
+            'modified': overview.modified,
+            'course_data': {
+                'effort': overview.effort,
+                'language': overview.language,
+                'is_self_paced': overview.self_paced
+            },
+            'course_details': CourseGradingModel.fetch(course_key),
+            'n_grades_subsection': {x: len(graded_subsections[x]) for x in graded_subsections.keys()},
+            'list_xblocks': get_list_xblocks(course_key),
+            'cohorted': is_course_cohorted(course_key),
+            'cert_enabled': cert_enabled(course_key)
+        }
+    cache.set(cache_key, snapshot, COURSE_SETTINGS_TIME)
+    return snapshot
+
+def clear_course_settings(course_key):
+    cache.delete(COURSE_SETTINGS_KEY.format(course_key))
+
+def get_report_access_score(access, at=None):
+    """
+        Return the views of the report decayed to the time at (now)
+    """
+    at = at or now()
+    return access.hits * 0.5 ** ((at - access.last_access).total_seconds() / REPORT_ACCESS_HALF_LIFE)
+
+def record_report_access(course_key, report, user_id):
+    """
+        Count a view of the course report, one per user each
+        REPORT_ACCESS_WINDOW seconds, decaying the previous views
+    """
+    if not cache.add(REPORT_ACCESS_KEY.format(course_key, report, user_id), True, REPORT_ACCESS_WINDOW):
+        return
+    current = now()
+    access, created = ReportAccess.objects.get_or_create(course_id=course_key, report=report, defaults={'hits': 1, 'last_access': current})
+    if not created:
+        # Skipped when a concurrent view already decayed the same last_access
+        ReportAccess.objects.filter(pk=access.pk, last_access=access.last_access).update(
+            hits=get_report_access_score(access, current) + 1,
+            last_access=current)
 
 def get_cert_generated(course_key):
     """
@@ -73,9 +362,7 @@ def get_list_xblocks(course_key):
     """
         Return list advanced modules
     """
-    with modulestore().bulk_operations(course_key):
-        course_module = modulestore().get_course(course_key)
-        return course_module.advanced_modules
+    return modulestore().get_course(course_key, depth=0).advanced_modules
 
 def _get_assignment_types(course_key):
     """
@@ -110,12 +397,76 @@ def get_grade_cutoff(course_key):
         logger.error(error_str, str(course_key), str(exception))
         return None
 
+def get_course_version(course_key):
+    """
+        Return the published version of the course, it changes on every
+        course publish. Cached with the modified time of the course
+        overview (updated on every publish, course_published is only sent
+        in Studio).
+    """
+    modified = CourseOverview.get_from_id(course_key).modified
+    cache_key = COURSE_VERSION_KEY.format(course_key)
+    cached = cache.get(cache_key)
+    if cached is not None and cached[0] == modified:
+        return cached[1]
+    course = modulestore().get_course(course_key, depth=0)
+    version = str(getattr(course, 'course_version', None) or course.subtree_edited_on)
+    cache.set(cache_key, (modified, version), STRUCTURE_CACHE_TIME)
+    return version
+
+def _is_scored(structure, block_key):
+    """
+        Check if the block or one of its descendants has a possible score
+    """
+    for descendant in structure.post_order_traversal(start_node=block_key):
+        if not structure.get_xblock_field(descendant, 'has_score', False):
+            continue
+        if structure.get_xblock_field(descendant, 'weight') == 0:
+            continue
+        max_score = structure.get_transformer_block_field(descendant, GradesTransformer, 'max_score')
+        if max_score is None or max_score > 0:
+            return True
+    return False
+
+def get_graded_subsections(course_key):
+    """
+        Return the graded subsections of the course in course order, with
+        'location', 'format' and 'display_name'.
+        Read from the collected block structure (not from a user grade) and
+        memoized by course version, so it is rebuilt after each publish.
+    """
+    cache_key = STRUCTURE_KEY.format('graded', course_key, get_course_version(course_key))
+    subsections = cache.get(cache_key)
+    if subsections is not None:
+        return subsections
+    subsections = []
+    structure = get_block_structure_manager(course_key).get_collected()
+    for chapter in structure.get_children(structure.root_block_usage_key):
+        for sequential in structure.get_children(chapter):
+            if structure.get_xblock_field(sequential, 'graded', False) and _is_scored(structure, sequential):
+                subsections.append({
+                    'location': sequential,
+                    'format': structure.get_xblock_field(sequential, 'format'),
+                    'display_name': structure.get_xblock_field(sequential, 'display_name'),
+                })
+    cache.set(cache_key, subsections, STRUCTURE_CACHE_TIME)
+    return subsections
+
+def get_graded_subsections_by_format(course_key):
+    """
+        Return the graded subsections grouped by format (Homework, Lab, Exam),
+        like CourseGrade.graded_subsections_by_format
+    """
+    subsections_by_format = OrderedDict()
+    for subsection in get_graded_subsections(course_key):
+        subsections_by_format.setdefault(subsection['format'], OrderedDict())[subsection['location']] = subsection
+    return subsections_by_format
+
 def get_all_persistant_grades_headers(user, course_key):
     """
         Return grades type
     """
-    response = CourseGradeFactory().read(user, course_key=course_key)
-    data = response.graded_subsections_by_format
+    data = get_graded_subsections_by_format(course_key)
     headers = []
     for grade_type in data.keys(): #Homework, lab, exam
         for inx, usage_key in enumerate(data[grade_type].keys()): #usage_key by grade type
@@ -123,33 +474,280 @@ def get_all_persistant_grades_headers(user, course_key):
             headers.append(label)
     return headers
 
-def get_all_persistant_grades(user, course_key):
+def get_grade_matrix(course_key, user_ids, usage_keys):
     """
-        Get all user grades
+        Build a dense students x subsections matrix of percent grades,
+        stored as hundredths of a percent (66.67 -> 6667).
+        Row i belongs to user_ids[i] and column j to usage_keys[j],
+        cells without an attempted grade (or without possible points, like
+        the grade signals) are NOT_ATTEMPTED.
     """
-    user_grades = defaultdict(dict)
-    enrolled_users = CourseEnrollment.objects.filter(is_active=1, course_id=course_key).exclude(user__courseaccessrole__course_id=course_key).values('user__id', 'user__username')
-    user_ids = {x['user__id']:x['user__username'] for x in enrolled_users}
-    response = CourseGradeFactory().read(user, course_key=course_key)
-    data = response.graded_subsections_by_format
+    rows = {user_id: inx for inx, user_id in enumerate(user_ids)}
+    columns = {usage_key: inx for inx, usage_key in enumerate(usage_keys)}
+    matrix = np.full((len(rows), len(columns)), NOT_ATTEMPTED, dtype=np.int32)
+    if len(rows) == 0 or len(columns) == 0:
+        return matrix
+    #TO DO: check override persistant grade
+    earned_grades = PersistentSubsectionGrade.objects.filter(
+        course_id=course_key,
+        usage_key__in=usage_keys,
+        first_attempted__isnull=False,
+        possible_graded__gt=0).values_list('user_id', 'usage_key', 'earned_graded', 'possible_graded')
+    earned_grades = filter_enrolled_users(earned_grades, course_key, user_ids)
+    cell_rows = []
+    cell_columns = []
+    earned = []
+    possible = []
+    for user_id, usage_key, earned_graded, possible_graded in earned_grades.iterator(chunk_size=GRADE_MATRIX_CHUNK_SIZE):
+        row = rows.get(user_id)
+        if row is None:
+            continue
+        cell_rows.append(row)
+        cell_columns.append(columns[usage_key.map_into_course(course_key)])
+        earned.append(earned_graded)
+        possible.append(possible_graded)
+    if len(cell_rows) > 0:
+        percents = (np.array(earned, dtype=np.float64) / np.array(possible, dtype=np.float64)) * 100
+        matrix[cell_rows, cell_columns] = round_half_up_hundredths(percents)
+    return matrix
+
+def get_grade_columns(user, course_key):
+    """
+        Return the grades report headers with the label and usage key
+        of each graded subsection column
+    """
+    data = get_graded_subsections_by_format(course_key)
     headers = [{ 'name': 'username', 'data': 'username', 'visible': True }]
+    labels = []
+    usage_keys = []
     for grade_type in data.keys(): #Homework, lab, exam
         for inx, usage_key in enumerate(data[grade_type].keys()): #usage_key by grade type
             label = '{} {}'.format(grade_type, (inx + 1))
             headers.append({ 'name': label, 'data': label, 'visible': True })
-            #TO DO: check override persistant grade
-            earned_grades = PersistentSubsectionGrade.objects.filter(course_id=course_key, usage_key=usage_key, user_id__in=user_ids.keys(), first_attempted__isnull=False).values('user_id', 'earned_graded', 'possible_graded', 'first_attempted', 'modified')
-            aux_user_graded = [] 
-            for x in earned_grades:
-                aux_user_graded.append(x['user_id'])
-                percent_grade = round_half_up((x['earned_graded']/x['possible_graded'])*100)
-                user_grades[x['user_id']][label] = percent_grade
-            diff_user_ids = user_ids.keys() - aux_user_graded
-            for x in diff_user_ids:
-                user_grades[x][label] = 0
-    for x in user_grades.keys():
-        user_grades[x]['username'] = user_ids[x]
-    return {'headers': headers, 'data': list(user_grades.values())}
+            labels.append(label)
+            usage_keys.append(usage_key)
+    return headers, labels, usage_keys
+
+def get_enrollment_snapshot(course_key):
+    """
+        Stage: the enrolled students of the course, 'grades_users' (ids and
+        usernames, without staff) and 'students' (id, username and email,
+        with staff, by username). Cached until the enrollments or course
+        roles change, or for ENROLLMENT_STAGE_TIME (profile changes).
+    """
+    def compute():
+        enrolled_users = get_enrolled_students(course_key).values('user__id', 'user__username')
+        user_ids = []
+        usernames = []
+        for x in enrolled_users:
+            user_ids.append(x['user__id'])
+            usernames.append(x['user__username'])
+        students = list(User.objects.filter(
+            courseenrollment__course_id=course_key,
+            courseenrollment__is_active=1
+        ).order_by('username').values('id', 'username', 'email'))
+        return {'grades_users': (user_ids, usernames), 'students': students}
+    dependencies = [stages.get_generation(ENROLLMENT_GENERATION, course_key)]
+    return stages.get_stage('enrollment', course_key, dependencies, compute, ENROLLMENT_STAGE_TIME)
+
+def get_certificate_set(course_key):
+    """
+        Stage: ids of the enrolled users (with staff) with a downloadable
+        certificate
+    """
+    def compute():
+        certificates = GeneratedCertificate.objects.filter(status='downloadable', course_id=course_key).values("user_id")
+        return set(x['user_id'] for x in filter_enrolled_users(certificates, course_key, include_staff=True))
+    dependencies = [stages.get_generation(x, course_key) for x in [ENROLLMENT_GENERATION, CERTIFICATES_GENERATION]]
+    return stages.get_stage('certificates', course_key, dependencies, compute)
+
+def _get_students_checksum(user_ids):
+    return zlib.crc32(np.asarray(user_ids, dtype=np.int64).tobytes())
+
+def _get_matrix_by_chunks(compute, students_id, progress=None):
+    """
+        Compute a students matrix MAX_USER_IDS_PARAMS students at a time,
+        calling progress(done, total) after each chunk
+    """
+    chunks = []
+    for start in range(0, len(students_id), MAX_USER_IDS_PARAMS):
+        chunks.append(compute(students_id[start:start + MAX_USER_IDS_PARAMS]))
+        if progress is not None:
+            progress(min(start + MAX_USER_IDS_PARAMS, len(students_id)), len(students_id))
+    if len(chunks) == 0:
+        return compute(students_id)
+    return np.vstack(chunks)
+
+def get_course_grade_matrix(course_key, user_ids, usage_keys, progress=None):
+    """
+        Stage: the grade matrix of all the enrolled students (user_ids from
+        the enrollment snapshot), recomputed when the students, grades or
+        course structure change
+    """
+    dependencies = [get_course_version(course_key), _get_students_checksum(user_ids), stages.get_generation(GRADES_GENERATION, course_key)]
+    return stages.get_stage(
+        'grade_matrix',
+        course_key,
+        dependencies,
+        lambda: _get_matrix_by_chunks(lambda x: get_grade_matrix(course_key, x, usage_keys), user_ids, progress))
+
+def _get_enrolled_grades_users(course_key):
+    """
+        Return ids and usernames of the enrolled students (without staff)
+    """
+    return get_enrollment_snapshot(course_key)['grades_users']
+
+def _iter_grade_rows(usernames, labels, matrix):
+    """
+        Yield the report row of each student of the grade matrix
+    """
+    for row, username in enumerate(usernames):
+        aux_user_grades = {}
+        for col, label in enumerate(labels):
+            percent_grade = int(matrix[row, col])
+            aux_user_grades[label] = 0 if percent_grade == NOT_ATTEMPTED else percent_grade / 100
+        aux_user_grades['username'] = username
+        yield aux_user_grades
+
+def get_all_persistant_grades(user, course_key, progress=None):
+    """
+        Get all user grades, progress(done, total) is called as the
+        students grades are read
+    """
+    user_ids, usernames = _get_enrolled_grades_users(course_key)
+    headers, labels, usage_keys = get_grade_columns(user, course_key)
+    if len(usage_keys) == 0:
+        return {'headers': headers, 'data': []}
+    matrix = get_course_grade_matrix(course_key, user_ids, usage_keys, progress)
+    return {'headers': headers, 'data': list(_iter_grade_rows(usernames, labels, matrix))}
+
+def iter_persistant_grades(user, course_key, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+        Return the grades report headers and a generator of its rows,
+        the grades are read chunk_size students at a time
+    """
+    user_ids, usernames = _get_enrolled_grades_users(course_key)
+    headers, labels, usage_keys = get_grade_columns(user, course_key)
+
+    def rows():
+        if len(usage_keys) == 0:
+            return
+        for start in range(0, len(user_ids), chunk_size):
+            matrix = get_grade_matrix(course_key, user_ids[start:start + chunk_size], usage_keys)
+            yield from _iter_grade_rows(usernames[start:start + chunk_size], labels, matrix)
+    return headers, rows()
+
+def get_grades_partial(course_key, user_ids, usernames, progress=None):
+    """
+        Compute the grades of a shard of students, their rows of the grade
+        matrix and the [grade, count] pairs of each column (the mergeable
+        partial aggregates). Json serializable, it is a celery result.
+    """
+    headers, labels, usage_keys = get_grade_columns(None, course_key)
+    matrix = np.zeros((len(user_ids), 0), dtype=np.int32)
+    if len(usage_keys) > 0:
+        matrix = _get_matrix_by_chunks(lambda x: get_grade_matrix(course_key, x, usage_keys), user_ids, progress)
+    counts = []
+    for col in range(len(usage_keys)):
+        subsection_grades = matrix[:, col]
+        col_counts = np.bincount(subsection_grades[subsection_grades != NOT_ATTEMPTED], minlength=1)
+        counts.append([[int(x), int(col_counts[x])] for x in np.flatnonzero(col_counts)])
+    return {
+        'block_ids': [str(x) for x in usage_keys],
+        'user_ids': user_ids,
+        'usernames': usernames,
+        'grades': matrix.tolist(),
+        'counts': counts
+    }
+
+def merge_grades_partials(course_key, partials, aggregates_version=None):
+    """
+        Merge the shards of get_grades_partial (in the students order),
+        store them as the grade aggregates of the course (the version
+        started before computing the shards) and return the grades report
+        details
+    """
+    headers, labels, usage_keys = get_grade_columns(None, course_key)
+    block_ids = [str(x) for x in usage_keys]
+    if any(x['block_ids'] != block_ids for x in partials):
+        raise ValueError("The graded subsections of {} changed while computing the report".format(course_key))
+    user_ids = [user_id for x in partials for user_id in x['user_ids']]
+    usernames = [username for x in partials for username in x['usernames']]
+    if len(usage_keys) == 0:
+        return {'headers': headers, 'data': []}
+    matrix = np.array([row for x in partials for row in x['grades']], dtype=np.int32).reshape((len(user_ids), len(usage_keys)))
+    subsections = {}
+    for col, block_id in enumerate(block_ids):
+        counts = defaultdict(int)
+        for x in partials:
+            for percent_grade, count in x['counts'][col]:
+                counts[percent_grade] += count
+        rows = np.flatnonzero(matrix[:, col] != NOT_ATTEMPTED)
+        subsections[block_id] = {
+            'values': {user_ids[row]: int(matrix[row, col]) for row in rows},
+            'counts': dict(counts)
+        }
+    summary_block_ids = list(get_header_grades_sort(None, course_key).keys())
+    if set(summary_block_ids) == set(block_ids):
+        set_grade_aggregates(course_key, aggregates_version or start_grade_aggregates(course_key), summary_block_ids, set(user_ids), subsections)
+    return {'headers': headers, 'data': list(_iter_grade_rows(usernames, labels, matrix))}
+
+def get_grades_sort_index(details):
+    """
+        Return the row positions of the grades report sorted by username
+        and by each grade column, used to paginate the cached report
+    """
+    rows = details['data']
+    usernames = np.array([row['username'] for row in rows], dtype=object)
+    index = {'username': np.argsort(usernames, kind='stable').astype(np.int32)}
+    for header in details['headers'][1:]:
+        values = np.array([row[header['data']] for row in rows], dtype=np.float64)
+        index[header['data']] = np.argsort(values, kind='stable').astype(np.int32)
+    return index
+
+def _get_grade_type(label):
+    """
+        Return the assignment type of a grade label ('Exam 2' -> 'Exam')
+    """
+    return label.rsplit(' ', 1)[0]
+
+def get_grades_page(data, index, page_size, offset=0, sort='username', reverse=False, search=None, grade_types=None):
+    """
+        Return a page of the cached grades report (decoded as columns, see
+        report_codec.decode_grades_columns), sorted by username or a grade
+        label with its sort index, filtered by a username search and
+        projected on the columns of grade_types (e.g. ['Exam']).
+        Only the rows of the page are built. The summary is projected on
+        the same columns.
+    """
+    if sort not in index:
+        raise ValueError("Invalid sort column: {}".format(sort))
+    columns = [(inx, x) for inx, x in enumerate(data['headers'][1:]) if not grade_types or _get_grade_type(x['data']) in grade_types]
+    headers = [data['headers'][0]] + [x for inx, x in columns]
+    order = index[sort][::-1] if reverse else index[sort]
+    usernames = data['usernames']
+    if search:
+        search = search.lower()
+        order = [x for x in order if search in usernames[x].lower()]
+    grades = data['grades']
+    page = []
+    for x in order[offset:offset + page_size]:
+        row = {'username': usernames[x]}
+        for inx, header in columns:
+            value = int(grades[x, inx])
+            row[header['data']] = 0 if value == data['missing'] else value / 100
+        page.append(row)
+    summary = OrderedDict()
+    for block_id, block_summary in data['summary'].items():
+        if not grade_types or _get_grade_type(block_summary['format']) in grade_types:
+            summary[block_id] = block_summary
+    return {
+        'headers': headers,
+        'data': page,
+        'summary': summary,
+        'count': len(order),
+        'next_offset': offset + page_size if offset + page_size < len(order) else None
+    }
 
 def is_course_cohorted(course_key):
     """
@@ -161,7 +759,7 @@ def cert_enabled(course_key):
     """
         Check if cert is enabled
     """
-    certs_api.cert_generation_enabled(course_key)
+    return certs_api.cert_generation_enabled(course_key)
 
 def get_user_info(username, course_key):
     """
@@ -170,25 +768,121 @@ def get_user_info(username, course_key):
     user = User.objects.get(username=username)
     enroll_info = CourseEnrollment.objects.get(is_active=1, course_id=course_key, user=user)
     cert_info = GeneratedCertificate.objects.filter(course_id=course_key, status='downloadable', user=user).exists()
-    return {
+    info = {
         'fullname': user.profile.name,
         'email': user.email,
         'enroll_date': enroll_info.created,
         'enroll_mode': enroll_info.mode,
-        'cert': cert_info,
-        'passed': _get_course_grade_passed(user, course_key),
-        'grades': user_grade_summary(user, course_key)
+        'cert': cert_info
+    }
+    info.update(get_learner_grades(course_key, [user]).get(user.id, {'passed': False, 'grades': []}))
+    return info
+
+def get_users_info(usernames, course_key):
+    """
+        Return the course info of many users by username, like
+        get_user_info, with bulk queries and the bulk grades iterator.
+        Users not enrolled in the course are omitted.
+    """
+    enrollments = CourseEnrollment.objects.filter(
+        is_active=1,
+        course_id=course_key,
+        user__username__in=usernames).select_related('user', 'user__profile')
+    enrollments = {x.user_id: x for x in enrollments}
+    certificates = set(GeneratedCertificate.objects.filter(
+        course_id=course_key,
+        status='downloadable',
+        user_id__in=list(enrollments.keys())).values_list('user_id', flat=True))
+    learner_grades = get_learner_grades(course_key, [x.user for x in enrollments.values()])
+    users_info = {}
+    for user_id, enroll_info in enrollments.items():
+        if user_id not in learner_grades:
+            continue
+        user = enroll_info.user
+        users_info[user.username] = {
+            'fullname': user.profile.name,
+            'email': user.email,
+            'enroll_date': enroll_info.created,
+            'enroll_mode': enroll_info.mode,
+            'cert': user_id in certificates
+        }
+        users_info[user.username].update(learner_grades[user_id])
+    return users_info
+
+def _get_learner_grade_keys(course_key, user_ids):
+    """
+        Return the cache key of the grade of each learner, from the course
+        version, the last modified time of the learner subsection grades and
+        the modified time of the learner course grade (and the language of
+        the summary)
+    """
+    version = get_course_version(course_key)
+    modified = dict(PersistentSubsectionGrade.objects.filter(
+        course_id=course_key,
+        user_id__in=user_ids).values('user_id').annotate(modified=Max('modified')).order_by().values_list('user_id', 'modified'))
+    course_modified = dict(PersistentCourseGrade.objects.filter(
+        course_id=course_key,
+        user_id__in=user_ids).values_list('user_id', 'modified'))
+    timestamp = lambda x: x.timestamp() if x is not None else None
+    return {
+        user_id: LEARNER_GRADE_KEY.format(course_key, version, user_id, timestamp(modified.get(user_id)), timestamp(course_modified.get(user_id)), get_language())
+        for user_id in user_ids
     }
 
+def get_learner_grades(course_key, users):
+    """
+        Return 'passed' and the grades summary of each learner (by id),
+        both from one course grade read. Memoized by course version,
+        learner and last modified subsection and course grade, only when
+        the grades are persisted. The grades that are not memoized are read
+        with the bulk grades iterator, learners whose grade fails are
+        omitted.
+    """
+    keys = {}
+    learner_grades = {}
+    if should_persist_grades(course_key):
+        keys = _get_learner_grade_keys(course_key, [x.id for x in users])
+        cached = cache.get_many(list(keys.values()))
+        learner_grades = {user_id: cached[key] for user_id, key in keys.items() if key in cached}
+    missing = [x for x in users if x.id not in learner_grades]
+    if len(missing) == 0:
+        return learner_grades
+    course = get_course_by_id(course_key)
+    to_cache = {}
+    for user, course_grade, error in CourseGradeFactory().iter(missing, course=course):
+        if error is not None:
+            logger.warning("EolInstructor - Error reading the grade of %s in %s: %s", user.username, str(course_key), error)
+            continue
+        learner_grades[user.id] = {
+            'passed': course_grade.passed,
+            'grades': get_grade_summary(course_grade, course)
+        }
+        if user.id in keys:
+            to_cache[keys[user.id]] = learner_grades[user.id]
+    if len(to_cache) > 0:
+        cache.set_many(to_cache, LEARNER_GRADE_TIME)
+    return learner_grades
+
 def user_grade_summary(user, course_key):
     """
         Get summary of grades user
     """
+    return get_learner_grades(course_key, [user]).get(user.id, {'grades': []})['grades']
+
+def get_grade_summary(course_grade, course):
+    """
+        Get the chapters and sections summary of a course grade, the last
+        history of every overridden section is read in one query
+    """
     #agregar el location de cada subsection
     summary = []
-    course = get_course_by_id(course_key)
-    course_grade = CourseGradeFactory().read(user, course)
     courseware_summary = list(course_grade.chapter_grades.values())
+    override_ids = [seq.override.id for chapter in courseware_summary for seq in chapter['sections'] if seq.override is not None]
+    last_override_history = {}
+    if len(override_ids) > 0:
+        override_history = PersistentSubsectionGradeOverride.history.filter(id__in=override_ids).order_by('created', 'history_id')
+        for history in override_history:
+            last_override_history[history.id] = history
     for chapter in courseware_summary:
         aux = {'children': []}
         if not chapter['display_name'] == "hidden":
@@ -206,8 +900,8 @@ def user_grade_summary(user, course_key):
                 if seq.due is not None and not course.self_paced:
                     aux2['due'] = seq.due
                 if seq.override is not None:
-                    last_override_history = seq.override.get_history().order_by('created').last()
-                    if (not last_override_history or last_override_history.system == grades_constants.GradeOverrideFeatureEnum.proctoring) and seq.format == "Exam" and earned == 0:
+                    override_history = last_override_history.get(seq.override.id)
+                    if (not override_history or override_history.system == grades_constants.GradeOverrideFeatureEnum.proctoring) and seq.format == "Exam" and earned == 0:
                         aux2['override'] = _("Suspicious activity detected during proctored exam review. Exam score 0.")
                     else:
                         aux2['override'] = _("Section grade has been overridden.")
@@ -221,43 +915,107 @@ def user_grade_summary(user, course_key):
             summary.append(aux)
     return summary
 
-def _get_course_grade_passed(user, course_key):
+def round_half_up(number):
+    return float(Decimal(str(float(number))).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+def round_half_up_hundredths(numbers):
     """
-        Get 'passed' (Boolean representing whether the course has been
-        passed according to the course's grading policy.)
+        Vectorized round_half_up for non negative numbers, returns the
+        rounded values as integer hundredths (12.345 -> 1235).
+        A float is rounded up when it is at least the float nearest to the
+        .xx5 tie, the same result as rounding its str() with Decimal.
     """
-    course_grade = CourseGradeFactory().read(user, course_key=course_key)
-    return course_grade.passed
+    numbers = np.asarray(numbers, dtype=np.float64)
+    hundredths = np.floor(numbers * 100 + 0.5)
+    hundredths -= numbers < (2 * hundredths - 1) / 200
+    hundredths += numbers >= (2 * hundredths + 1) / 200
+    return hundredths.astype(np.int64)
 
-def round_half_up(number):
-    return float(Decimal(str(float(number))).quantize(Decimal('0.01'), ROUND_HALF_UP))
+def _float_sqrt_of_fraction(number):
+    """
+        Correctly rounded float square root of a non negative Fraction
+        (math.sqrt(float(x)) rounds twice)
+    """
+    n, m = number.numerator, number.denominator
+    q = (n.bit_length() - m.bit_length() - 109) // 2
+    if q >= 0:
+        n, m, denominator = n, m << 2 * q, 1
+    else:
+        n, m, denominator = n << -2 * q, m, 1 << -q
+    root = math.isqrt(n // m)
+    # Round to odd, so the final division rounds correctly
+    root |= root * root * m != n
+    if q >= 0:
+        return float(root << q)
+    return root / denominator
+
+def _float_pvariance_before_py310(values, weights, n_grades):
+    """
+        statistics.pvariance of the float grades as computed by Python < 3.10
+        (the deviations from the float mean are rounded as floats), used with
+        math.sqrt by its pstdev
+    """
+    grades_mean = float(sum(w * v for w, v in zip(weights, values)) / n_grades)
+    deviations = [float(v) - grades_mean for v in values]
+    total = sum(w * Fraction(d ** 2) for w, d in zip(weights, deviations))
+    total -= sum(w * Fraction(d) for w, d in zip(weights, deviations)) ** 2 / n_grades
+    return float(total / n_grades)
+
+def get_grade_statistics(counts, n_students):
+    """
+        Return the summary fields of a subsection from counts, where
+        counts[h] is the number of grades equal to h hundredths of a percent.
+        Grades are only rounded when the result is built, avg and dev are
+        computed exactly like statistics.mean/pstdev over the float grades
+        (pstdev is correctly rounded since Python 3.10).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    grades_values = np.flatnonzero(counts)
+    grades_counts = counts[grades_values]
+    n_grades = int(grades_counts.sum())
+    grades_range = np.bincount(np.minimum(grades_values // 500, 20), weights=grades_counts, minlength=21)
+    avg = dev = min_grade = max_grade = 0
+    if n_grades > 0:
+        values = [Fraction(int(x) / 100) for x in grades_values]
+        weights = grades_counts.tolist()
+        grades_mean = sum(w * v for w, v in zip(weights, values)) / n_grades
+        variance = sum(w * (v - grades_mean) ** 2 for w, v in zip(weights, values)) / n_grades
+        avg = round_half_up(float(grades_mean))
+        if sys.version_info < (3, 10):
+            dev = round_half_up(math.sqrt(_float_pvariance_before_py310(values, weights, n_grades)))
+        else:
+            dev = round_half_up(_float_sqrt_of_fraction(variance))
+        min_grade = int(grades_values[0]) / 100
+        max_grade = int(grades_values[-1]) / 100
+    return {
+        'avg': avg,
+        'grades_range': [int(x) for x in grades_range],
+        'min': min_grade,
+        'max': max_grade,
+        'dev': dev,
+        'len': n_grades,
+        'rate': round_half_up((n_grades/n_students)*100) if n_students > 0 else 0
+    }
 
 def get_header_grades(user, course_key):
     """
         Gets the Grades according to their configuration on grades page
     """
     grades = []
-    response = CourseGradeFactory().read(user, course_key=course_key)
-    data = response.graded_subsections_by_format
+    data = get_graded_subsections_by_format(course_key)
     for grade_type in data.keys():
         for inx, usage_key in enumerate(data[grade_type].keys()):
             label = '{} {}'.format(grade_type, (inx + 1))
             grades.append([label, str(usage_key)])
     return grades
 
-#@lazy
 def get_header_grades_sort(user, course_key):
     """
         Gets the Grades according to their release order
     """
-    response = CourseGradeFactory().read(user, course_key=course_key)
-    subsections = defaultdict(OrderedDict)
-    for chapter in six.itervalues(response.chapter_grades):
-        for subsection_grade in chapter['sections']:
-            if subsection_grade.graded:
-                graded_total = subsection_grade.graded_total
-                if graded_total.possible > 0:
-                    subsections[str(subsection_grade.location)] = subsection_grade.format
+    subsections = OrderedDict()
+    for subsection in get_graded_subsections(course_key):
+        subsections[str(subsection['location'])] = subsection['format']
     return subsections
 
 def get_course_grade_summary(user, course_key):
@@ -265,169 +1023,290 @@ def get_course_grade_summary(user, course_key):
         Return a summary grades by block ids
     """
     subsections = get_header_grades_sort(user, course_key)
+    aggregates = get_grade_aggregates(course_key, list(subsections.keys()))
+    if aggregates is None:
+        aggregates = reconcile_grade_aggregates(course_key, list(subsections.keys()))
     grades = OrderedDict()
-    enrolled_users = CourseEnrollment.objects.filter(is_active=1, course_id=course_key).exclude(user__courseaccessrole__course_id=course_key).values('user__id')
-    user_ids = [x['user__id'] for x in enrolled_users]
     aux_format = {}
-    #TO DO: check override persistant grade
     for block_id in subsections.keys():
-        usage_key = UsageKey.from_string(block_id)
-        grades_range = [0]*21
-        subsection_grades = []
-        earned_grades = PersistentSubsectionGrade.objects.filter(course_id=course_key, usage_key=usage_key, user_id__in=user_ids, first_attempted__isnull=False).values('user_id', 'earned_graded', 'possible_graded',)
         if subsections[block_id] in aux_format:
             aux_format[subsections[block_id]] = aux_format[subsections[block_id]] + 1
         else:
             aux_format[subsections[block_id]] = 1
-
-        for x in earned_grades:
-            percent_grade = round_half_up((x['earned_graded']/x['possible_graded'])*100)
-            subsection_grades.append(percent_grade)
-            grades_range[int(percent_grade/5)] = grades_range[int(percent_grade/5)] + 1
-        grades[block_id] = {
-            'grades': subsection_grades,
-            'avg': round_half_up(mean(subsection_grades)) if len(subsection_grades) > 0 else 0,
-            'grades_range':grades_range,
-            'min': min(subsection_grades) if len(subsection_grades) > 0 else 0,
-            'max': max(subsection_grades) if len(subsection_grades) > 0 else 0,
-            'dev': round_half_up(pstdev(subsection_grades)) if len(subsection_grades) > 0 else 0,
-            'len': len(subsection_grades),
-            'rate': round_half_up((len(subsection_grades)/len(user_ids))*100),
-            'format': "{} {}".format(subsections[block_id], aux_format[subsections[block_id]])
-        }
+        aggregate = aggregates['subsections'][block_id]
+        counts = np.zeros(max(aggregate['counts'].keys(), default=0) + 1, dtype=np.int64)
+        for percent_grade, count in aggregate['counts'].items():
+            counts[percent_grade] = count
+        grades[block_id] = {'grades': [x / 100 for x in aggregate['values'].values()]}
+        grades[block_id].update(get_grade_statistics(counts, len(aggregates['students'])))
+        grades[block_id]['format'] = "{} {}".format(subsections[block_id], aux_format[subsections[block_id]])
     return grades
 
-#####################
-#### Completion  ####
-#####################
-def get_content(info, id_course):
+def _get_grade_aggregate_key(course_key, version, name):
+    return "{}-{}-{}".format(GRADE_AGGREGATES_KEY.format(course_key), version, name)
+
+def _set_aggregate_grade(subsection, user_id, percent_grade):
     """
-        Returns dictionary of ordered sections, subsections and units
+        Set the grade of a student in the aggregate of a subsection (None
+        when not attempted), moving its count from the old to the new grade
     """
-    max_unit = 0   # Number of units in all sections
-    content = OrderedDict()
-    children_course = info[id_course]
-    children_course = children_course['children']  # All course sections
-    children = 0  # Number of units per section
-    for id_section in children_course:  # Iterate each section
-        section = info[id_section]
-        aux_name_sec = section['metadata']
-        children = 0
-        content[id_section] = {
-            'type': 'section',
-            'name': aux_name_sec['display_name'],
-            'id': id_section,
-            'num_children': children}
-        subsections = section['children']
-        for id_subsection in subsections:  # Iterate each subsection
-            subsection = info[id_subsection]
-            units = subsection['children']
-            aux_name = subsection['metadata']
-            len_unit = len(units)
-            content[id_subsection] = {
-                'type': 'subsection',
-                'name': aux_name['display_name'],
-                'id': id_subsection,
-                'num_children': 0}
-            for id_uni in units:  # Iterate each unit and get unit name
-                unit = info[id_uni]
-                if len(unit['children']) > 0:
-                    max_unit += 1
-                    content[id_uni] = {
-                        'type': 'unit',
-                        'name': unit['metadata']['display_name'],
-                        'id': id_uni}
-                else:
-                    len_unit -= 1
-            children += len_unit
-            content[id_subsection]['num_children'] = len_unit
-        content[id_section] = {
-            'type': 'section',
-            'name': aux_name_sec['display_name'],
-            'id': id_section,
-            'num_children': children}
+    values = subsection['values']
+    counts = subsection['counts']
+    old = values.pop(user_id, None)
+    if old is not None:
+        counts[old] -= 1
+        if counts[old] == 0:
+            del counts[old]
+    if percent_grade is not None:
+        values[user_id] = percent_grade
+        counts[percent_grade] = counts.get(percent_grade, 0) + 1
 
-    return content, max_unit
+def get_grade_aggregates(course_key, block_ids):
+    """
+        Return the cached aggregates of the subsections, or None when they
+        are expired, incomplete or were built for other subsections.
+        Each aggregate has the grade of every student who attempted the
+        subsection ('values', user_id -> hundredths) and how many students
+        have each grade ('counts', hundredths -> count), count, sum, sum of
+        squares, histogram, min and max are all derived from 'counts'.
+        The stored aggregates are updated with the grades saved (and the
+        students enrolled or unenrolled) since they were stored, adjusting
+        only the counts of the changed grades, and stored again.
+    """
+    meta = cache.get(GRADE_AGGREGATES_KEY.format(course_key))
+    if meta is None or meta['subsections'] != block_ids:
+        return None
+    n_deltas = cache.get(_get_grade_aggregate_key(course_key, meta['version'], 'deltas'))
+    if n_deltas is None or n_deltas > MAX_GRADE_DELTAS:
+        return None
+    base = get_report(_get_grade_aggregate_key(course_key, meta['version'], 'base'))
+    if base is None:
+        return None
+    state = pickle.loads(base)
+    delta_keys = [_get_grade_aggregate_key(course_key, meta['version'], 'delta-{}'.format(x)) for x in range(state['applied'] + 1, n_deltas + 1)]
+    deltas = cache.get_many(delta_keys)
+    if len(deltas) != len(delta_keys):
+        return None
+    subsections = state['subsections']
+    # Grades of the users that are not enrolled students
+    others = state['others']
+    students = set(_get_enrolled_grades_users(course_key)[0])
+    for user_id in state['students'] - students:
+        for block_id in block_ids:
+            percent_grade = subsections[block_id]['values'].get(user_id)
+            if percent_grade is not None:
+                _set_aggregate_grade(subsections[block_id], user_id, None)
+                others[block_id][user_id] = percent_grade
+    for user_id in students - state['students']:
+        for block_id in block_ids:
+            percent_grade = others[block_id].pop(user_id, None)
+            if percent_grade is not None:
+                _set_aggregate_grade(subsections[block_id], user_id, percent_grade)
+    for key in delta_keys:
+        block_id, user_id, percent_grade = deltas[key]
+        if block_id not in subsections:
+            continue
+        if user_id in students:
+            _set_aggregate_grade(subsections[block_id], user_id, percent_grade)
+        elif percent_grade is None:
+            others[block_id].pop(user_id, None)
+        else:
+            others[block_id][user_id] = percent_grade
+    if len(delta_keys) > 0 or students != state['students']:
+        state['applied'] = n_deltas
+        state['students'] = students
+        set_report(
+            _get_grade_aggregate_key(course_key, meta['version'], 'base'),
+            pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL),
+            GRADES_RECONCILE_TIME)
+    return {'students': students, 'subsections': subsections}
 
-def dump_module(
-        module,
-        destination=None,
-        inherited=False,
-        defaults=False):
+def reconcile_grade_aggregates(course_key, block_ids):
     """
-    Add the module and all its children to the destination dictionary in
-    as a flat structure.
+        Rebuild the aggregates of the subsections from the persistent grades,
+        this corrects any drift of the incremental updates
     """
+    version = start_grade_aggregates(course_key)
+    enrolled_users = get_enrolled_students(course_key).values('user__id')
+    user_ids = [x['user__id'] for x in enrolled_users]
+    usage_keys = [UsageKey.from_string(block_id) for block_id in block_ids]
+    matrix = get_grade_matrix(course_key, user_ids, usage_keys)
+    subsections = {}
+    for col, block_id in enumerate(block_ids):
+        subsection_grades = matrix[:, col]
+        rows = np.flatnonzero(subsection_grades != NOT_ATTEMPTED)
+        counts = np.bincount(subsection_grades[rows], minlength=1)
+        subsections[block_id] = {
+            'values': {user_ids[row]: int(subsection_grades[row]) for row in rows},
+            'counts': {int(x): int(counts[x]) for x in np.flatnonzero(counts)}
+        }
+    return set_grade_aggregates(course_key, version, block_ids, set(user_ids), subsections)
 
-    destination = destination if destination else {}
+def start_grade_aggregates(course_key):
+    """
+        Start a new version of the aggregates, to call before reading the
+        grades. The grades saved from now on are also logged for it, so
+        the ones saved while it is built are not lost.
+    """
+    version = uuid4().hex
+    cache.set(_get_grade_aggregate_key(course_key, version, 'deltas'), 0, GRADES_RECONCILE_TIME * 2)
+    cache.set(GRADE_AGGREGATES_KEY.format(course_key) + "-next", version, GRADES_RECONCILE_TIME)
+    return version
 
-    items = own_metadata(module)
+def set_grade_aggregates(course_key, version, block_ids, students, subsections):
+    """
+        Store the aggregates of the subsections as the version started by
+        start_grade_aggregates
+    """
+    state = {
+        'applied': 0,
+        'students': students,
+        'subsections': {block_id: subsections[block_id] for block_id in block_ids},
+        'others': {block_id: {} for block_id in block_ids},
+    }
+    set_report(
+        _get_grade_aggregate_key(course_key, version, 'base'),
+        pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL),
+        GRADES_RECONCILE_TIME)
+    # The meta key is written last, readers never see a partial version
+    cache.set(
+        GRADE_AGGREGATES_KEY.format(course_key),
+        {'version': version, 'subsections': block_ids},
+        GRADES_RECONCILE_TIME)
+    return {'students': students, 'subsections': subsections}
 
-    # HACK: add discussion ids to list of items to export (AN-6696)
-    if isinstance(
-            module,
-            DiscussionXBlock) and 'discussion_id' not in items:
-        items['discussion_id'] = module.discussion_id
+def update_grade_aggregate(course_key, usage_key, user_id, percent_grade):
+    """
+        Log a committed subsection grade for the cached aggregates of the
+        course (and for the version being built, if any). percent_grade is
+        None when the subsection is not attempted.
+        Each grade is an atomic increment of the log length and a new key,
+        concurrent saves never overwrite each other. When the log of the
+        current version is lost the version is dropped, it is rebuilt on
+        the next summary request.
+    """
+    meta_key = GRADE_AGGREGATES_KEY.format(course_key)
+    cached = cache.get_many([meta_key, meta_key + "-next"])
+    current = cached[meta_key]['version'] if meta_key in cached else None
+    versions = set(x for x in [current, cached.get(meta_key + "-next")] if x is not None)
+    if percent_grade is not None:
+        percent_grade = int(round_half_up_hundredths([percent_grade])[0])
+    delta = (str(usage_key.map_into_course(course_key)), user_id, percent_grade)
+    for version in versions:
+        try:
+            n_delta = cache.incr(_get_grade_aggregate_key(course_key, version, 'deltas'))
+        except ValueError:
+            if version == current:
+                cache.delete(meta_key)
+            continue
+        cache.set(_get_grade_aggregate_key(course_key, version, 'delta-{}'.format(n_delta)), delta, GRADES_RECONCILE_TIME * 2)
 
-    filtered_metadata = {
-        k: v for k,
-        v in six.iteritems(items) if k not in FILTER_LIST}
+#####################
+#### Completion  ####
+#####################
+def _get_completion_students(course_key):
+    return get_enrollment_snapshot(course_key)['students']
 
-    destination[six.text_type(module.location)] = {
-        'category': module.location.block_type,
-        'children': [six.text_type(child) for child in getattr(module, 'children', [])],
-        'metadata': filtered_metadata,
-    }
+def get_course_blocks_info(course_key):
+    """
+        Return a flat dict of the course blocks with their 'category',
+        'children' and 'metadata' (display_name only). Read in one pass
+        from the collected block structure and memoized by course version,
+        stored in chunks (big courses exceed the size of a cache item).
+    """
+    def compute():
+        info = {}
+        structure = get_block_structure_manager(course_key).get_collected()
+        for block_key in structure.topological_traversal():
+            info[str(block_key)] = {
+                'category': block_key.block_type,
+                'children': [str(child) for child in structure.get_children(block_key)],
+                'metadata': {'display_name': structure.get_xblock_field(block_key, 'display_name')},
+            }
+        return info
+    return stages.get_stage('blocks', course_key, [get_course_version(course_key)], compute, STRUCTURE_CACHE_TIME)
 
-    if inherited:
-        # When calculating inherited metadata, don't include existing
-        # locally-defined metadata
-        inherited_metadata_filter_list = list(filtered_metadata.keys())
-        inherited_metadata_filter_list.extend(INHERITED_FILTER_LIST)
+def _get_completion_content(course_key):
+    info = get_course_blocks_info(course_key)
+    id_course = str(BlockUsageLocator(course_key, "course", "course"))
+    content, max_unit = get_content(info, id_course)
+    return info, content, max_unit
 
-        def is_inherited(field):
-            if field.name in inherited_metadata_filter_list:
-                return False
-            elif field.scope != Scope.settings:
-                return False
-            elif defaults:
-                return True
-            else:
-                return field.values != field.default
+def get_completion_course(course_key, progress=None):
+    """
+        Get subsection completeness, progress(done, total) is called as
+        the students completions are read
+    """
+    enrolled_students = _get_completion_students(course_key)
+    info, content, max_unit = _get_completion_content(course_key)
+    data = get_ticks(content, info, enrolled_students, course_key, max_unit, progress)
+    return data
 
-        inherited_metadata = {field.name: field.read_json(
-            module) for field in list(module.fields.values()) if is_inherited(field)}
-        destination[six.text_type(
-            module.location)]['inherited_metadata'] = inherited_metadata
+def get_completion_partial(course_key, students, progress=None):
+    """
+        Compute the completion rows of a shard of students and how many
+        of them have a certificate. Json serializable, it is a celery result.
+    """
+    info, content, max_unit = _get_completion_content(course_key)
+    partial = {'rows': [], 'n_certificates': 0}
+    for rows, percents, n_certificates in _iter_ticks(content, info, students, course_key, max_unit, progress=progress):
+        partial['rows'].extend(rows)
+        partial['n_certificates'] += n_certificates
+    return partial
 
-    for child in module.get_children():
-        dump_module(child, destination, inherited, defaults)
+def merge_completion_partials(partials, n_students):
+    """
+        Merge the shards of get_completion_partial (in the students order)
+        into the completion report, like get_ticks
+    """
+    rows = [row for x in partials for row in x['rows']]
+    completion = []
+    if len(rows) > 0:
+        percents = np.array([row[3:-1] for row in rows], dtype=np.float64)
+        completion = (round_half_up_hundredths(np.cumsum(percents, axis=0)[-1] / n_students) / 100).tolist()
+    completion.append(sum(x['n_certificates'] for x in partials))
+    return {
+        'data': rows if n_students > 0 else [[True]],
+        'completion': completion
+    }
 
-    return destination
+def get_completion_headers(content):
+    """
+        Return the completion report column names, in the same order
+        as the rows of get_ticks
+    """
+    headers = [_('Email'), _('Username'), _('Rut')]
+    section_name = None
+    for block in content.values():
+        if block['type'] == 'subsection':
+            headers.append(block['name'])
+        if block['type'] == 'section' and block['num_children'] > 0:
+            if section_name is not None:
+                headers.append(section_name)
+            section_name = block['name']
+    headers.append(section_name)
+    headers.append(_('Total'))
+    headers.append(_('Certificate'))
+    return headers
 
-def get_completion_course(course_key):
+def iter_completion_course(course_key, chunk_size=EXPORT_CHUNK_SIZE):
     """
-        Get subsection completeness
+        Return the completion report headers and a generator of its rows,
+        the completions are read chunk_size students at a time
     """
-    enrolled_students = list(User.objects.filter(
-            courseenrollment__course_id=course_key,
-            courseenrollment__is_active=1
-        ).order_by('username').values('id', 'username', 'email'))
-    store = modulestore()
-    info = dump_module(store.get_course(course_key))
-    id_course = str(BlockUsageLocator(course_key, "course", "course"))
-    content, max_unit = get_content(info, id_course)
-    data = get_ticks(content, info, enrolled_students, course_key, max_unit)
-    return data
+    enrolled_students = _get_completion_students(course_key)
+    info, content, max_unit = _get_completion_content(course_key)
+
+    def rows():
+        for rows, percents, n_certificates in _iter_ticks(content, info, enrolled_students, course_key, max_unit, chunk_size):
+            yield from rows
+    return get_completion_headers(content), rows()
 
 def get_header_completion(course_key):
     """
         Get headers to create table head
     """
-    store = modulestore()
-    info = dump_module(store.get_course(course_key))
-    id_course = str(BlockUsageLocator(course_key, "course", "course"))
-    content, max_unit = get_content(info, id_course)
+    info, content, max_unit = _get_completion_content(course_key)
 
     context = {
         "content": content,
@@ -461,119 +1340,243 @@ def get_content(info, id_course):
             max_unit += len(subsection['children'])
     return content, max_unit
 
-def get_block(students_id, course_key):
+def get_completion_columns(content, info):
     """
-        Get all completed students block
+        Return the index of each leaf block of the course (the children of
+        the units) and a blocks x columns membership matrix. Columns follow
+        the completion rows: each subsection, each section after its
+        subsections and the course total.
+        Discussion blocks count as not completed, they are not in the index.
     """
+    blocks = []
+    columns = []
+    section_blocks = []
+    first = True
+    for subsection in content.values():
+        if subsection['type'] == 'subsection':
+            subsection_blocks = []
+            for x in info[subsection['id']]['children']:
+                for xblock_id in info[x]['children']:
+                    subsection_blocks.append(len(blocks))
+                    blocks.append(xblock_id)
+            columns.append(subsection_blocks)
+            section_blocks.extend(subsection_blocks)
+        if not first and subsection['type'] == 'section' and subsection['num_children'] > 0:
+            columns.append(section_blocks)
+            section_blocks = []
+        if first and subsection['type'] == 'section' and subsection['num_children'] > 0:
+            first = False
+    columns.append(section_blocks)
+    columns.append(list(range(len(blocks))))
+    membership = np.zeros((len(blocks), len(columns)), dtype=np.int32)
+    for inx, column_blocks in enumerate(columns):
+        membership[column_blocks, inx] = 1
+    block_index = defaultdict(list)
+    for inx, xblock_id in enumerate(blocks):
+        if 'discussion+block' not in xblock_id:
+            block_index[xblock_id].append(inx)
+    return block_index, membership
+
+def get_completion_matrix(students_id, course_key, block_index, n_blocks):
+    """
+        Return a students x blocks boolean matrix of the completed blocks
+    """
+    rows = {user_id: inx for inx, user_id in enumerate(students_id)}
+    matrix = np.zeros((len(students_id), n_blocks), dtype=bool)
     context_key = LearningContextKey.from_string(str(course_key))
     aux_blocks = BlockCompletion.objects.filter(
-        user_id__in=students_id,
         context_key=context_key,
-        completion=1.0).values(
+        completion=1.0).values_list(
         'user_id',
         'block_key')
-    blocks = defaultdict(list)
-    for b in aux_blocks:
-        blocks[b['user_id']].append(str(b['block_key']))
+    aux_blocks = filter_enrolled_users(aux_blocks, course_key, students_id, include_staff=True)
+    cell_rows = []
+    cell_columns = []
+    for user_id, block_key in aux_blocks.iterator(chunk_size=GRADE_MATRIX_CHUNK_SIZE):
+        row = rows.get(user_id)
+        if row is None:
+            continue
+        for column in block_index.get(str(block_key), []):
+            cell_rows.append(row)
+            cell_columns.append(column)
+    matrix[cell_rows, cell_columns] = True
+    return matrix
+
+def _get_completion_bitset_key(course_key, log, name):
+    return "{}-{}-{}".format(COMPLETION_BITSETS_KEY.format(course_key), log, name)
+
+def get_completion_log(course_key, version):
+    """
+        Return the id of the completion log of the course version. The
+        bitsets and the completions saved after they were built are stored
+        under it. A new log (with new bitsets) is started for a new
+        version or when the log was lost.
+    """
+    key = COMPLETION_BITSETS_KEY.format(course_key)
+    meta = cache.get(key)
+    if meta is not None and meta['version'] == version and cache.get(_get_completion_bitset_key(course_key, meta['log'], 'deltas')) is not None:
+        return meta['log']
+    log = uuid4().hex
+    cache.set(_get_completion_bitset_key(course_key, log, 'deltas'), 0, COMPLETION_BITSET_TIME * 2)
+    cache.set(key, {'version': version, 'log': log}, COMPLETION_BITSET_TIME * 2)
+    return log
 
-    return blocks
+def get_completion_bitsets(students_id, course_key, log, block_index, n_blocks):
+    """
+        Return a students x blocks boolean matrix of the completed blocks
+        from the cached per learner bitsets, with the completions logged
+        after each one was built. Bitsets that are missing, older than
+        COMPLETION_BITSET_TIME or built before a lost completion are
+        rebuilt from BlockCompletion.
+    """
+    n_deltas = cache.get(_get_completion_bitset_key(course_key, log, 'deltas'))
+    keys = [_get_completion_bitset_key(course_key, log, user_id) for user_id in students_id]
+    cached = cache.get_many(keys) if n_deltas is not None else {}
+    matrix = np.zeros((len(students_id), n_blocks), dtype=bool)
+    built = {}
+    for row, key in enumerate(keys):
+        bitset = cached.get(key)
+        if bitset is not None and time.time() - bitset[0] <= COMPLETION_BITSET_TIME and n_deltas - bitset[1] <= MAX_COMPLETION_DELTAS:
+            matrix[row] = np.unpackbits(np.frombuffer(bitset[2], dtype=np.uint8), count=n_blocks)
+            built[row] = bitset[1]
+    if len(built) > 0:
+        first = min(built.values()) + 1
+        delta_keys = [_get_completion_bitset_key(course_key, log, 'delta-{}'.format(x)) for x in range(first, n_deltas + 1)]
+        deltas = cache.get_many(delta_keys)
+        rows = {students_id[row]: row for row in built}
+        for n_delta, key in enumerate(delta_keys, first):
+            if key not in deltas:
+                for row in [x for x, n_built in built.items() if n_built < n_delta]:
+                    del built[row]
+                    del rows[students_id[row]]
+                continue
+            user_id, block_key, completed = deltas[key]
+            row = rows.get(user_id)
+            if row is not None and built[row] < n_delta:
+                matrix[row, block_index.get(block_key, [])] = completed
+    missing = [row for row in range(len(students_id)) if row not in built]
+    if len(missing) > 0:
+        # Completions logged from now on are applied to the rebuilt bitsets
+        built_time = time.time()
+        missing_matrix = get_completion_matrix([students_id[x] for x in missing], course_key, block_index, n_blocks)
+        matrix[missing] = missing_matrix
+        if n_deltas is not None:
+            cache.set_many(
+                {keys[x]: (built_time, n_deltas, np.packbits(bits).tobytes()) for x, bits in zip(missing, missing_matrix)},
+                COMPLETION_BITSET_TIME * 2)
+    return matrix
+
+def get_course_completion_matrix(students_id, course_key, version, log, block_index, n_blocks, progress=None):
+    """
+        Stage: the completion matrix of all the enrolled students, recomputed
+        from the bitsets when the students, completions or course structure
+        change
+    """
+    dependencies = [version, _get_students_checksum(students_id), stages.get_generation(COMPLETION_GENERATION, course_key)]
+    return stages.get_stage(
+        'completion_matrix',
+        course_key,
+        dependencies,
+        lambda: _get_matrix_by_chunks(lambda x: get_completion_bitsets(x, course_key, log, block_index, n_blocks), students_id, progress))
+
+def update_completion_bitset(course_key, block_key, user_id, completed):
+    """
+        Log a committed BlockCompletion for the cached bitsets of the course.
+        Each completion is an atomic increment of the log length and a new
+        key, concurrent saves never overwrite each other. When the log is
+        lost it is dropped, the bitsets are rebuilt on the next report.
+    """
+    key = COMPLETION_BITSETS_KEY.format(course_key)
+    meta = cache.get(key)
+    if meta is None:
+        return
+    try:
+        n_delta = cache.incr(_get_completion_bitset_key(course_key, meta['log'], 'deltas'))
+    except ValueError:
+        cache.delete(key)
+        return
+    cache.set(
+        _get_completion_bitset_key(course_key, meta['log'], 'delta-{}'.format(n_delta)),
+        (user_id, str(block_key), completed),
+        COMPLETION_BITSET_TIME * 2)
+
+def get_completion_percents(matrix, membership):
+    """
+        Return the students x columns completion percents, as hundredths
+    """
+    completed = matrix.astype(np.int32) @ membership
+    totals = membership.sum(axis=0)
+    percents = np.divide(completed, totals, out=np.zeros(completed.shape), where=totals > 0) * 100
+    return round_half_up_hundredths(percents)
+
+def _iter_ticks(
+        content,
+        info,
+        enrolled_students,
+        course_key,
+        max_unit,
+        chunk_size=None,
+        progress=None):
+    """
+        Yield for each chunk of students their completion rows, their
+        completion percents matrix and how many have a certificate
+    """
+    block_index, membership = get_completion_columns(content, info)
+    version = get_course_version(course_key)
+    log = get_completion_log(course_key, version)
+    chunk_size = chunk_size or max(len(enrolled_students), 1)
+    for start in range(0, len(enrolled_students), chunk_size):
+        students = enrolled_students[start:start + chunk_size]
+        students_id = [x['id'] for x in students]
+        certificate = get_certificate_set(course_key).intersection(students_id)
+        if len(students) == len(enrolled_students):
+            matrix = get_course_completion_matrix(students_id, course_key, version, log, block_index, membership.shape[0], progress)
+        else:
+            matrix = get_completion_bitsets(students_id, course_key, log, block_index, membership.shape[0])
+        percents = get_completion_percents(matrix, membership) / 100
+        rows = []
+        for x, user_percents in zip(students, percents.tolist()):
+            students_rut = x['edxloginuser__run'] if 'edxloginuser__run' in x else ''
+            rows.append(
+                [x['email'], x['username'], students_rut if students_rut != None else ''] +
+                user_percents +
+                ['Si' if x['id'] in certificate else 'No'])
+        yield rows, percents, len(certificate)
 
 def get_ticks(
         content,
         info,
         enrolled_students,
         course_key,
-        max_unit):
+        max_unit,
+        progress=None):
     """
         Dictionary of students with ticks if students completed the units
     """
     user_tick = defaultdict(list)
-    students_id = []
-    students_username = []
-    students_email = []
-    students_rut = []
-    for x in enrolled_students:
-        students_id.append(x['id'])
-        students_username.append(x['username'])
-        students_email.append(x['email'])
-        students_rut.append(x['edxloginuser__run'] if 'edxloginuser__run' in x else '')
-    certificate = get_certificate(students_id, course_key)
-    blocks = get_block(students_id, course_key)
-    completion = []
+    completion = None
     aux_cert = 0
-    for inx, user in enumerate(students_id):
-        # Get a list of true/false if they completed the units
-        # and number of completed units
-        data, aux_completion = get_data_tick(content, info, user, blocks, max_unit)
-        aux_user_tick = deque(data)
-        aux_user_tick.appendleft(students_rut[inx] if students_rut[inx] != None else '')
-        aux_user_tick.appendleft(students_username[inx])
-        aux_user_tick.appendleft(students_email[inx])
-        aux_user_tick.append('Si' if user in certificate else 'No')
-        user_tick['data'].append(list(aux_user_tick))
-        if user in certificate:
-            aux_cert += 1
-        if len(completion) != 0:
-            completion = list( map(add, completion, aux_completion) )
-        else:
-            completion = aux_completion
-    completion = [round_half_up(x/len(students_id)) for x in completion]
+    for rows, percents, n_certificates in _iter_ticks(content, info, enrolled_students, course_key, max_unit, progress=progress):
+        user_tick['data'].extend(rows)
+        aux_cert += n_certificates
+        # Sequential sum (cumsum) of the rounded percents, as the reports
+        # always did, so the averages round the same way
+        if completion is not None:
+            percents = np.vstack([completion, percents])
+        completion = np.cumsum(percents, axis=0)[-1]
+    if completion is not None:
+        completion = (round_half_up_hundredths(completion / len(enrolled_students)) / 100).tolist()
+    else:
+        completion = []
     completion.append(aux_cert)
     user_tick['completion'] = completion
-    if len(students_id) == 0:
+    if len(enrolled_students) == 0:
         user_tick['data'] = [[True]]
     return user_tick
 
-def get_data_tick(content, info, user_id, blocks, max_unit):
-    """
-        Get a list of true/false if they completed the units
-        and number of completed units
-    """
-    data = []
-    aux_completion = []
-    completed_unit = 0  # Number of completed units per student
-    completed_unit_per_section = 0  # Number of completed units per section
-    num_units_section = 0  # Number of units per section
-    section_data = [0,0]
-    total_units = [0,0]
-    first = True
-    for subsection in content.values():
-        if subsection['type'] == 'subsection':
-            subsection_info = info[subsection['id']]
-            blocks_unit = []
-            for x in subsection_info['children']:
-                blocks_unit = blocks_unit + info[x]['children']
-            completed = 0
-            for xblock_id in blocks_unit:
-                if xblock_id in blocks[user_id] and 'discussion+block' not in xblock_id:
-                    completed += 1
-            data.append(round_half_up((completed/len(blocks_unit))*100))
-            aux_completion.append(round_half_up((completed/len(blocks_unit))*100))
-            section_data[0] += completed
-            section_data[1] += len(blocks_unit)
-            total_units[0] += completed
-            total_units[1] += len(blocks_unit)
-        if not first and subsection['type'] == 'section' and subsection['num_children'] > 0:
-            aux_point = round_half_up((section_data[0]/section_data[1])*100)
-            data.append(aux_point)
-            aux_completion.append(aux_point)
-            section_data = [0,0]
-        if first and subsection['type'] == 'section' and subsection['num_children'] > 0:
-            first = False
-    aux_point = round_half_up((section_data[0]/section_data[1])*100)
-    data.append(aux_point)
-    aux_completion.append(aux_point)
-    aux_final_point = round_half_up((total_units[0]/total_units[1])*100)
-    data.append(aux_final_point)
-    aux_completion.append(aux_final_point)
-    return data, aux_completion
-
 def get_certificate(students_id, course_id):
     """
         Check if users has generated a certificate
     """
-    certificates = GeneratedCertificate.objects.filter(status='downloadable',
-        user_id__in=students_id, course_id=course_id).values("user_id")
-    cer_students_id = [x["user_id"] for x in certificates]
-
-    return cer_students_id
+    certificates = get_certificate_set(course_id)
+    return [x for x in students_id if x in certificates]
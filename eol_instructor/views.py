@@ -1,7 +1,11 @@
 #!/usr/bin/env python
 # -- coding: utf-8 --
 
+import csv
+import base64
+import gzip
 import re
+import time
 import uuid
 import json
 import logging
@@ -14,12 +18,13 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.db import transaction
-from django.http import HttpResponseRedirect, HttpResponseForbidden, Http404, JsonResponse
+from django.http import HttpResponseRedirect, HttpResponseForbidden, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.urls import reverse
 from django.utils.translation import ugettext as _
 from django.views.generic.base import View
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
 from lms.djangoapps.courseware.access import has_access, get_user_role
 from lms.djangoapps.courseware.courses import get_course_by_id, get_course_with_access
 from lms.djangoapps.instructor import permissions
@@ -29,7 +34,9 @@ from openedx.core.djangoapps.site_configuration import helpers as configuration_
 from openedx.core.djangoapps.content.course_overviews.models import CourseOverview
 from xmodule.modulestore.django import modulestore
 from . import utils
-from .tasks import task_process_eolgrades, task_process_eolcompletion
+from .report_codec import decode_grades_report, decode_grades_columns, decode_grades_index, decode_completion_report, decode_report, decode_row_hashes, get_report_delta
+from .report_storage import get_report, get_report_manifest
+from .tasks import task_process_eolgrades, task_process_eolcompletion, get_grades_report_key, get_completion_report_key, fail_lost_report, get_progress, is_running, get_report_body_key, get_row_hashes_key, GRADES_TIME_CACHE, COMPLETION_TIME_CACHE, REFRESH_LOCK_TIME
 logger = logging.getLogger(__name__)
 
 #####################
@@ -40,67 +47,214 @@ def get_user_data(course_key):
     """
         Get student enrollment info
     """
-    enrolled_users = CourseEnrollment.objects.filter(is_active=1, course_id=course_key).exclude(user__courseaccessrole__course_id=course_key)
-    modes = {}
-    for x in enrolled_users.values('mode').distinct().order_by():
-        modes[x['mode']] = enrolled_users.filter(mode=x['mode']).count()
-
-    staff_users = CourseAccessRole.objects.filter(course_id=course_key).values('user').distinct()
-    grades = utils.get_courses_grades(course_key, enrolled_users)
-    activity = utils.get_students_activity(course_key, enrolled_users)
-    activity_last_week = utils.get_students_activity_last_week(course_key, enrolled_users)
-    return {
-        'n_team': staff_users.count(),
-        'n_student': enrolled_users.count(),
-        'n_student_modes': modes,
-        'n_passed': grades,
-        'activity_started': activity,
-        'activity_last_week': activity_last_week
-    }
+    return utils.get_course_metrics(course_key)
 
 def get_course_data(course_key):
     """
         Get course info
     """
-    course = CourseOverview.objects.get(id=course_key)
-    return {
-        'effort': course.effort,
-        'language': course.language,
-        'is_self_paced': course.self_paced    
-    }
+    return utils.get_course_settings(course_key)['course_data']
 
 def get_evaluations(course_key, user):
     """
         Get Assignment Types
     """
-    from cms.djangoapps.models.settings.course_grading import CourseGradingModel
-    with modulestore().bulk_operations(course_key):
-        course_details = CourseGradingModel.fetch(course_key)
-        from lms.djangoapps.grades.course_grade_factory import CourseGradeFactory
-        response = CourseGradeFactory().read(user, course_key=course_key)
-        data = response.graded_subsections_by_format
-        return {
-            'n_grades_subsection': {x: len(data[x]) for x in data.keys() },
-            'course_details': course_details
-            }
+    course_settings = utils.get_course_settings(course_key)
+    return {
+        'n_grades_subsection': course_settings['n_grades_subsection'],
+        'course_details': course_settings['course_details']
+        }
 
 def get_course_extra_info(course_key):
     """
        Get extra course info
     """
-    n_cert_generated = utils.get_cert_generated(course_key)
-    list_xblocks = utils.get_list_xblocks(course_key)
+    course_settings = utils.get_course_settings(course_key)
     return {
-        'n_cert_generated': n_cert_generated,
-        'cohorted': utils.is_course_cohorted(course_key),
-        'list_xblocks': list_xblocks,
-        'cert_enabled': utils.cert_enabled(course_key)
+        'n_cert_generated': utils.get_cert_generated(course_key),
+        'cohorted': course_settings['cohorted'],
+        'list_xblocks': course_settings['list_xblocks'],
+        'cert_enabled': course_settings['cert_enabled']
     }
 
+def check_report_access(request, course_key):
+    """
+        Raise Http404 if the user is not staff or data researcher
+    """
+    course = get_course_with_access(request.user, "load", course_key)
+    staff_access = bool(has_access(request.user, 'staff', course))
+    data_researcher_access = request.user.has_perm(permissions.CAN_RESEARCH, course_key)
+    if not (staff_access or data_researcher_access):
+        raise Http404()
+
+def submit_refresh(request, course_id, key, task_process):
+    """
+        Submit the computation of the report, unless it was just submitted
+    """
+    if cache.add(key + "-refresh", True, REFRESH_LOCK_TIME):
+        try:
+            task_process(request, course_id)
+        except AlreadyRunningError:
+            pass
+
+def get_report_or_refresh(request, course_id, key, soft_timeout, task_process):
+    """
+        Return the stored report and its age in seconds, (None, None) when
+        it is missing. Reports older than soft_timeout are still returned
+        and a single background refresh is submitted.
+    """
+    manifest = get_report_manifest(key)
+    report = get_report(key, manifest) if manifest is not None else None
+    age = int(time.time() - manifest['created']) if report is not None else None
+    if report is None or age > soft_timeout:
+        submit_refresh(request, course_id, key, task_process)
+    return report, age
+
+def get_report_response(request, course_id, key, soft_timeout, task_process):
+    """
+        Return the stored report as a conditional response, versioned with
+        the ETag and Last-Modified of the report: 304 when the client has
+        the current version, else its pre-serialized gzipped json. The age
+        of the report is in the Age and X-Report-Stale headers.
+        None when the report or its json are missing.
+    """
+    manifest = get_report_manifest(key)
+    if manifest is None:
+        return None
+    age = int(time.time() - manifest['created'])
+    if age > soft_timeout:
+        submit_refresh(request, course_id, key, task_process)
+    etag = '"{}"'.format(manifest['version'])
+    if_none_match = [x.strip() for x in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        body = get_report(get_report_body_key(key, manifest['version']))
+        if body is None:
+            return None
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(body, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type='application/json')
+        response['Vary'] = 'Accept-Encoding'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(manifest['created'])
+    response['Cache-Control'] = 'private, no-cache'
+    response['Age'] = age
+    response['X-Report-Stale'] = 'true' if age > soft_timeout else 'false'
+    return response
+
+def get_report_delta_response(request, course_id, key, soft_timeout, task_process, since):
+    """
+        Return the learner rows added, changed and removed since the
+        report version 'since' (its ETag, quoted or not, or report_version)
+        with the rest of the current report (headers, summary...). 410 when
+        that version has expired.
+    """
+    since = since.strip()
+    if since.startswith('W/'):
+        since = since[2:]
+    since = since.strip('"')
+    if not re.match(r'^[0-9a-f]{32}$', since):
+        return JsonResponse({'error': 'Invalid report version'}, status=400)
+    manifest = get_report_manifest(key)
+    report = get_report(key, manifest) if manifest is not None else None
+    if report is None:
+        submit_refresh(request, course_id, key, task_process)
+        return JsonResponse({"data": False, "progress": get_progress(key)})
+    age = int(time.time() - manifest['created'])
+    if age > soft_timeout:
+        submit_refresh(request, course_id, key, task_process)
+    row_hashes = get_report(get_row_hashes_key(key, manifest['version']))
+    since_row_hashes = get_report(get_row_hashes_key(key, since))
+    if row_hashes is None or since_row_hashes is None:
+        return JsonResponse({'error': 'The report version has expired, reload the full report'}, status=410)
+    data = decode_report(report)
+    response = {k: v for k, v in data.items() if k not in ['details', 'data']}
+    if 'details' in data:
+        response['headers'] = data['details']['headers']
+    response['delta'] = get_report_delta(data, decode_row_hashes(row_hashes), decode_row_hashes(since_row_hashes))
+    response['since'] = since
+    response['report_version'] = manifest['version']
+    response['age'] = age
+    response['stale'] = age > soft_timeout
+    return JsonResponse(response)
+
+# Text cells starting with these are run as formulas by spreadsheets
+# (tab and carriage return hide the formula prefix that follows them)
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def escape_csv_cell(value):
+    """
+        Prefix the text cells that a spreadsheet would run as a formula
+    """
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+class Echo:
+    """
+        File-like object that returns the written value, used to
+        stream csv rows
+    """
+    def write(self, value):
+        return value
+
+def stream_report(headers, rows, export_format, filename):
+    """
+        Return a StreamingHttpResponse with the report in csv or ndjson,
+        rows are written as they are generated.
+        In csv the text cells are escaped (see escape_csv_cell).
+        In ndjson the first line has the headers and each row is
+        serialized as it is in the report 'data'.
+    """
+    if export_format == 'ndjson':
+        def content():
+            yield json.dumps({'headers': headers}) + '\n'
+            for row in rows:
+                yield json.dumps(row, default=str) + '\n'
+        response = StreamingHttpResponse(content(), content_type='application/x-ndjson')
+    else:
+        writer = csv.writer(Echo())
+        def content():
+            yield writer.writerow([escape_csv_cell(x) for x in headers])
+            for row in rows:
+                yield writer.writerow([escape_csv_cell(x) for x in row])
+        response = StreamingHttpResponse(content(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(filename, 'ndjson' if export_format == 'ndjson' else 'csv')
+    return response
+
 #####################
 ###### Grades  ######
 #####################
 
+PAGE_PARAMS = ['page_size', 'cursor', 'sort', 'order', 'search', 'grade_type']
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(offset, version):
+    """
+        Opaque cursor of a report page, bound to the report version
+    """
+    return base64.urlsafe_b64encode('{}:{}'.format(version, offset).encode()).decode()
+
+def decode_cursor(cursor, version):
+    """
+        Return the offset of the cursor, ValueError if the cursor is invalid
+        or belongs to another version of the report
+    """
+    try:
+        cursor_version, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    if cursor_version != version:
+        raise ValueError("The report has been updated, restart from the first page")
+    return offset
+
 class EolGrades(View):
     @transaction.non_atomic_requests
     def dispatch(self, args, **kwargs):
@@ -108,33 +262,149 @@ class EolGrades(View):
 
     def get(self, request, course_id, **kwargs):
         course_key = CourseKey.from_string(course_id)
-        course = get_course_with_access(request.user, "load", course_key)
-        staff_access = bool(has_access(request.user, 'staff', course))
-        data_researcher_access = request.user.has_perm(permissions.CAN_RESEARCH, course_key)
-        if not (staff_access or data_researcher_access):
-            raise Http404()
+        check_report_access(request, course_key)
 
+        utils.record_report_access(course_key, 'grades', request.user.id)
+        if request.GET.get('since'):
+            return get_report_delta_response(
+                request, course_id, get_grades_report_key(course_id), GRADES_TIME_CACHE, task_process_eolgrades, request.GET['since'])
+        if any(x in request.GET for x in PAGE_PARAMS):
+            report, age = get_report_or_refresh(
+                request, course_id, get_grades_report_key(course_id), GRADES_TIME_CACHE, task_process_eolgrades)
+            if report is None:
+                return JsonResponse(self.get_missing_context(course_id))
+            try:
+                return JsonResponse(self.get_page(request, report, age))
+            except ValueError as exception:
+                return JsonResponse({'error': str(exception)}, status=400)
+        response = get_report_response(request, course_id, get_grades_report_key(course_id), GRADES_TIME_CACHE, task_process_eolgrades)
+        if response is not None:
+            return response
         context = self.get_context(request, course_id)
 
         return JsonResponse(context)
 
+    def get_page(self, request, report, age):
+        """
+            Return a page of the grades report, decoding only its columns.
+            Params: page_size, cursor, sort (username or a grade label),
+            order (asc/desc), search (username) and grade_type (repeatable)
+        """
+        data = decode_grades_columns(report)
+        data['age'] = age
+        data['stale'] = age > GRADES_TIME_CACHE
+        index = decode_grades_index(report)
+        if len(index) == 0:
+            # Reports stored without their sort index
+            index = utils.get_grades_sort_index(decode_grades_report(report)['details'])
+        page_size = min(int(request.GET.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if page_size < 1:
+            raise ValueError("Invalid page_size")
+        offset = decode_cursor(request.GET['cursor'], data['version']) if request.GET.get('cursor') else 0
+        page = utils.get_grades_page(
+            data,
+            index,
+            page_size,
+            offset=offset,
+            sort=request.GET.get('sort', 'username'),
+            reverse=request.GET.get('order') == 'desc',
+            search=request.GET.get('search'),
+            grade_types=request.GET.getlist('grade_type'))
+        next_offset = page.pop('next_offset')
+        page['next_cursor'] = encode_cursor(next_offset, data['version']) if next_offset is not None else None
+        for key in ['time', 'time_queue', 'version', 'age', 'stale']:
+            page[key] = data[key]
+        return page
+
     def get_context(self, request, course_id):
         """
             Return eol completion data
         """
-        data = cache.get("eol_grades-" + course_id + "-data")
-        if data is None:
-            data = {"data": False}
-            try:
-                task_process_eolgrades(request, course_id)
-            except AlreadyRunningError:
-                pass
+        report, age = get_report_or_refresh(
+            request, course_id, get_grades_report_key(course_id), GRADES_TIME_CACHE, task_process_eolgrades)
+        if report is None:
+            return self.get_missing_context(course_id)
+        data = decode_grades_report(report)
+        data['age'] = age
+        data['stale'] = age > GRADES_TIME_CACHE
+        return data
+
+    def get_missing_context(self, course_id):
+        """
+            Return the progress of the report being computed and its summary,
+            if it was already published
+        """
+        data = {"data": False, "progress": get_progress(get_grades_report_key(course_id))}
+        partial = get_report(get_grades_report_key(course_id) + "-partial")
+        if partial is not None:
+            data['partial'] = json.loads(partial.decode('utf-8'))
         return data
 
+class EolGradesExport(View):
+    @transaction.non_atomic_requests
+    def dispatch(self, args, **kwargs):
+        return super(EolGradesExport, self).dispatch(args, **kwargs)
+
+    def get(self, request, course_id, **kwargs):
+        """
+            Stream the grades report, ?format=csv (default) or ndjson
+        """
+        course_key = CourseKey.from_string(course_id)
+        check_report_access(request, course_key)
+        export_format = request.GET.get('format', 'csv')
+        headers, rows = utils.iter_persistant_grades(request.user, course_key)
+        if export_format == 'ndjson':
+            return stream_report(headers, rows, export_format, 'grades')
+        labels = [x['data'] for x in headers]
+        csv_rows = ([row[x] for x in labels] for row in rows)
+        return stream_report([x['name'] for x in headers], csv_rows, export_format, 'grades')
+
+REPORTS_STATUS = {
+    'grades': (get_grades_report_key, GRADES_TIME_CACHE),
+    'completion': (get_completion_report_key, COMPLETION_TIME_CACHE),
+}
+
+class EolReportStatus(View):
+    def get(self, request, course_id, report, **kwargs):
+        """
+            Return the progress of the report computation ('step', 'done'
+            and 'total' students), whether it is running and the age of
+            the stored report
+        """
+        course_key = CourseKey.from_string(course_id)
+        check_report_access(request, course_key)
+        get_key, soft_timeout = REPORTS_STATUS[report]
+        key = get_key(course_id)
+        manifest = get_report_manifest(key)
+        age = int(time.time() - manifest['created']) if manifest is not None else None
+        fail_lost_report(report, course_key)
+        progress = get_progress(key)
+        return JsonResponse({
+            'progress': progress,
+            'running': is_running(key, progress),
+            'age': age,
+            'stale': age is not None and age > soft_timeout,
+            'partial': get_report_manifest(key + "-partial") is not None
+        })
+
 def get_user_info_api(request, username, course_id):
     course_key = CourseKey.from_string(course_id)
     return JsonResponse(utils.get_user_info(username, course_key), safe=False)
 
+MAX_USERS_INFO = 200
+
+def get_users_info_api(request, course_id):
+    """
+        Return the course info of the users ?username=a&username=b...,
+        by username, at most MAX_USERS_INFO users
+    """
+    course_key = CourseKey.from_string(course_id)
+    check_report_access(request, course_key)
+    usernames = list(set(request.GET.getlist('username')))
+    if len(usernames) > MAX_USERS_INFO:
+        return JsonResponse({'error': 'At most {} usernames'.format(MAX_USERS_INFO)}, status=400)
+    return JsonResponse(utils.get_users_info(usernames, course_key))
+
 #####################
 #### Completion  ####
 #####################
@@ -147,12 +417,15 @@ class EolCompletionInstructor(View):
 
     def get(self, request, course_id, **kwargs):
         course_key = CourseKey.from_string(course_id)
-        course = get_course_with_access(request.user, "load", course_key)
-        staff_access = bool(has_access(request.user, 'staff', course))
-        data_researcher_access = request.user.has_perm(permissions.CAN_RESEARCH, course_key)
-        if not (staff_access or data_researcher_access):
-            raise Http404()
+        check_report_access(request, course_key)
 
+        utils.record_report_access(course_key, 'completion', request.user.id)
+        if request.GET.get('since'):
+            return get_report_delta_response(
+                request, course_id, get_completion_report_key(course_id), COMPLETION_TIME_CACHE, task_process_eolcompletion, request.GET['since'])
+        response = get_report_response(request, course_id, get_completion_report_key(course_id), COMPLETION_TIME_CACHE, task_process_eolcompletion)
+        if response is not None:
+            return response
         context = self.get_context(request, course_id)
 
         return JsonResponse(context)
@@ -161,11 +434,26 @@ class EolCompletionInstructor(View):
         """
             Return eol completion data
         """
-        data = cache.get("eol_completion_instructor-" + course_id + "-data")
-        if data is None:
-            data = {"data": False}
-            try:
-                task_process_eolcompletion(request, course_id)
-            except AlreadyRunningError:
-                pass
+        report, age = get_report_or_refresh(
+            request, course_id, get_completion_report_key(course_id), COMPLETION_TIME_CACHE, task_process_eolcompletion)
+        if report is not None:
+            data = decode_completion_report(report)
+            data['age'] = age
+            data['stale'] = age > COMPLETION_TIME_CACHE
+        else:
+            data = {"data": False, "progress": get_progress(get_completion_report_key(course_id))}
         return data
+
+class EolCompletionExport(View):
+    @transaction.non_atomic_requests
+    def dispatch(self, args, **kwargs):
+        return super(EolCompletionExport, self).dispatch(args, **kwargs)
+
+    def get(self, request, course_id, **kwargs):
+        """
+            Stream the completion report, ?format=csv (default) or ndjson
+        """
+        course_key = CourseKey.from_string(course_id)
+        check_report_access(request, course_key)
+        headers, rows = utils.iter_completion_course(course_key)
+        return stream_report(headers, rows, request.GET.get('format', 'csv'), 'completion')